@@ -1,11 +1,66 @@
 import numpy as np
 import algorithm
-from algorithm import lee_router
+from algorithm import lee_router, route_nets
+from parallel_router import route_nets_parallel
+from route_cache import route_nets_cached
+from Visualizer.tiles import FREE, OBSTACLE, PATH, VIA, PIN
 
 import file_handling
 from file_handling import input_file
+from design_format import load_design
+from net_index import order_nets
+import os
 import sys
 
+def route_snapshot(snapshot, progress=None):
+    """One (paths, vias) or None per net of a FunctionalityWrapper.snapshot(), in net order,
+    fewer if progress cancelled routing"""
+    _, grid, nets, non_preferred_cost, via_cost, parallel_processes, cache = snapshot
+    if parallel_processes:
+        return route_nets_parallel(grid, nets, non_preferred_cost, via_cost, processes=parallel_processes,
+                                   progress=progress)
+    if cache is not None:
+        return route_nets_cached(grid, nets, non_preferred_cost, via_cost, cache=cache, progress=progress)
+    return route_nets(grid, nets, non_preferred_cost, via_cost, progress=progress)
+
+def render_snapshot(snapshot, progress=None):
+    """(visual_grid_3d, pins, vias) of a routed snapshot(), None if progress cancelled routing
+
+    Only reads the snapshot, so a worker thread can run it while the wrapper moves on.
+    """
+    grid, nets = snapshot[1], snapshot[2]
+    # uint8 class codes from Visualizer.tiles, a byte per cell even on very large grids
+    pins = []
+    vias_found = []
+    visual_grid_3d = np.full(np.shape(grid), FREE, dtype=np.uint8)
+
+    # obstacles
+    visual_grid_3d[grid == -1] = OBSTACLE
+
+    results = route_snapshot(snapshot, progress)
+    if len(results) < len(nets):
+        return None
+
+    for net, result in zip(nets, results):
+        # a net whose pins were covered by an earlier net is left unrouted
+        all_paths, all_vias = result if result is not None else ([], [])
+        path = np.array(all_paths, dtype=np.intp).reshape(-1, 3)
+        vias = np.array(all_vias, dtype=np.intp).reshape(-1, 2)
+
+        # path
+        visual_grid_3d[path[:, 0], path[:, 1], path[:, 2]] = PATH
+
+        # pins
+        for x, y, z in net:
+            visual_grid_3d[x, y, z] = PIN
+            pins.append((x, y, z))
+
+        # vias
+        visual_grid_3d[:, vias[:, 0], vias[:, 1]] = VIA
+        vias_found.extend((x, y) for x, y in vias.tolist())
+
+    return visual_grid_3d, pins, vias_found
+
 class FunctionalityWrapper:
     pins = []
     grid = []
@@ -19,55 +74,65 @@ class FunctionalityWrapper:
     current_layer_displayed = 0
     non_preferred_cost = 10
     via_cost = 50
+    # number of worker processes routing independent nets in parallel, 0 routes serially
+    parallel_processes = 0
+    # route_cache.RouteCache reused across launches for serial routing, None routes from scratch
+    route_cache = None
+
+    def __init__(self):
+        # (visual_grid_3d, pins, vias) per render_key(), so layer and display changes re-render
+        # without routing again
+        self._renders = {}
+        self._loaded_testcase = None
+        # bumped whenever testcase 5 draws a new random grid, so its old renders are never reused
+        self._generation = 0
 
     #def get_via_locations:
 
-    def update_grid_3d(self):
-        self.pins = []
-        self.vias = []
-        visual_grid_3d = np.array(self.grid, np.float32)
-        logical_grid_3d = np.array(self.grid, np.float32)
-
-        for net in self.nets:
-            all_paths, all_vias = lee_router(logical_grid_3d, net, self.non_preferred_cost, self.via_cost)
-            # print("PATH")
-            # print(all_paths)
-
-            # print("VIAS")
-            # print(all_vias)
-            path = np.array(all_paths, np.float32)
-            vias = np.array(all_vias, np.float32)
-
-
-            # obstacles
-            visual_grid_3d[visual_grid_3d == -1] = 64
-
-            # path
-            for x, y, z in path.astype(int):
-                visual_grid_3d[x, y, z] = 320
-                logical_grid_3d[x, y, z] = -1
-
-            # pins
-            for x, y, z in net:
-                logical_grid_3d[x, y, z] = -1
-                visual_grid_3d[x, y, z] = 512
-                self.pins.append((x, y, z))
-
-            # vias
-            via_direction = 0
-            for x,y in vias.astype(int):
-                visual_grid_3d[1,x,y] = 420
-                visual_grid_3d[0,x,y] = 420
-                self.vias.append((x, y))
-
-
-
-
-            # print("VISGIRD")
-            # print(visual_grid_3d)
+    def route_all_nets(self, progress=None):
+        # one (paths, vias) or None per net, in net order, fewer if progress cancelled routing
+        return route_snapshot(self.snapshot(), progress)
+
+    def load_testcase(self):
+        # parse the current testcase only when it changed since the last load
+        if self._loaded_testcase != self.current_testcase:
+            self.init_testcase()
+            self._loaded_testcase = self.current_testcase
+
+    def render_key(self):
+        return self.current_testcase, self._generation, self.non_preferred_cost, self.via_cost
+
+    def snapshot(self):
+        """The loaded testcase as (render_key, grid, nets, costs and routing settings) for
+        render_snapshot(), copied and read-only so later changes to the wrapper never reach it"""
+        grid = np.asarray(self.grid)
+        if grid.flags.writeable:
+            # a design from load_design is already a read-only memory map, anything else is copied
+            grid = grid.copy()
+            grid.setflags(write=False)
+        nets = tuple(tuple(tuple(int(v) for v in pin) for pin in net) for net in self.nets)
+        return (self.render_key(), grid, nets, self.non_preferred_cost, self.via_cost, self.parallel_processes,
+                self.route_cache)
+
+    def cached_render(self):
+        """The visual grid of the loaded testcase if it was routed before, setting pins and vias, else None"""
+        render = self._renders.get(self.render_key())
+        if render is None:
+            return None
+        visual_grid_3d, self.pins, self.vias = render
+        return visual_grid_3d
 
+    def store_render(self, key, render):
+        """Keep a render_snapshot() result under the render_key() of the snapshot it came from"""
+        self._renders[key] = render
 
-        return visual_grid_3d
+    def update_grid_3d(self, progress=None):
+        # route and render on the calling thread, setting pins and vias
+        render = render_snapshot(self.snapshot(), progress)
+        if render is None:
+            return None
+        self.store_render(self.render_key(), render)
+        return self.cached_render()
 
     def update_grid(self):
         visual_grid_3d = np.array(self.grid, np.float32)
@@ -111,27 +176,9 @@ class FunctionalityWrapper:
 
     # BONUS
     def net_reordering(self):
-        # Reorder nets based on the number of pins within their bounding box
-        net_pin_counts = []
-        all_pins = [pin for net in self.nets for pin in net]
-
-        for net in self.nets:
-            min_x = min(pin[1] for pin in net)
-            max_x = max(pin[1] for pin in net)
-            min_y = min(pin[2] for pin in net)
-            max_y = max(pin[2] for pin in net)
-
-            count = 0
-            for pin in all_pins:
-                x, y = pin[1], pin[2]
-                if min_x < x < max_x and min_y < y < max_y:
-                    count += 1
-
-            net_pin_counts.append((net, count))
-
-        net_pin_counts.sort(key=lambda x: x[1])
-
-        self.nets = [net for net, count in net_pin_counts]
+        # Reorder nets based on the number of pins within their bounding box, counted with a summed-area table
+        layers, rows, cols = np.shape(self.grid)
+        self.nets = [self.nets[i] for i in order_nets(self.nets, rows, cols)]
 
     def init_testcase(self):
         self.pins = []
@@ -186,6 +233,8 @@ class FunctionalityWrapper:
 
             # 1000x1000 random Grid testcase
             case 5:
+                self._generation += 1
+                self._renders = {key: render for key, render in self._renders.items() if key[0] != 5}
                 self.nets = []
                 grid_layer_0 = np.zeros((1000, 1000), dtype=int)
                 grid_layer_1 = np.zeros((1000, 1000), dtype=int)
@@ -193,9 +242,7 @@ class FunctionalityWrapper:
                 num_obstacles = int(0.10 * 1000 * 1000)
                 obstacle_indices = np.random.choice(1000*1000, num_obstacles, replace=False)
 
-                for idx in obstacle_indices:
-                    r, c = divmod(idx, 1000)
-                    grid_layer_0[r, c] = -1
+                grid_layer_0.flat[obstacle_indices] = -1
 
                 rand_pins = []
 
@@ -218,7 +265,11 @@ class FunctionalityWrapper:
                     via_cost = int(sys.argv[3]) if len(sys.argv) > 3 else 50
                     multi = True  # Always default to True
 
-                    self.grid, self.nets = input_file(user_file)
+                    # a binary design directory from design_format.py is memory-mapped instead of parsed
+                    if os.path.isdir(user_file):
+                        self.grid, self.nets, _ = load_design(user_file)
+                    else:
+                        self.grid, self.nets = input_file(user_file)
                     self.non_preferred_cost = non_preferred_cost
                     self.via_cost = via_cost
                     self.multiLayer = multi
@@ -0,0 +1,52 @@
+import numpy as np
+
+# class codes of the visual grid, the higher code wins where cells are merged in a zoomed-out level
+FREE, OBSTACLE, PATH, VIA, PIN = range(5)
+# value each code is drawn with through the colormap
+CODE_LEVELS = np.array([0, 64, 320, 420, 512], dtype=np.float32)
+
+TILE_SIZE = 512
+
+
+def downsample(codes):
+    """Halve a 2D code grid, every cell keeping the highest code of the up to 2x2 cells it covers"""
+    merged = codes[::2, ::2].copy()
+    for dr, dc in ((0, 1), (1, 0), (1, 1)):
+        part = codes[dr::2, dc::2]
+        corner = merged[:part.shape[0], :part.shape[1]]
+        np.maximum(corner, part, out=corner)
+    return merged
+
+class TilePyramid:
+    """A 2D code grid and its downsampled levels, cut into square tiles for display
+
+    Level k has one cell per 2**k x 2**k grid cells, levels are added until one tile covers
+    the whole grid. Tiles are views, only the downsampled levels take extra memory.
+    """
+
+    def __init__(self, codes, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.levels = [codes]
+        while max(codes.shape) > tile_size:
+            codes = downsample(codes)
+            self.levels.append(codes)
+
+    def level_for(self, cell_pixels):
+        # the coarsest level whose cells are still no larger than a screen pixel
+        if cell_pixels >= 1:
+            return 0
+        return min(int(np.log2(1 / cell_pixels)), len(self.levels) - 1)
+
+    def visible_tiles(self, level, x0, x1, y0, y1):
+        """(level, tile_row, tile_col) of every tile of level overlapping columns x0..x1 and rows y0..y1 of the grid"""
+        span = self.tile_size * 2 ** level
+        rows, cols = self.levels[level].shape
+        t_rows = -(-rows // self.tile_size)
+        t_cols = -(-cols // self.tile_size)
+        r0, r1 = max(int(min(y0, y1) // span), 0), min(int(max(y0, y1) // span) + 1, t_rows)
+        c0, c1 = max(int(min(x0, x1) // span), 0), min(int(max(x0, x1) // span) + 1, t_cols)
+        return [(level, ti, tj) for ti in range(r0, r1) for tj in range(c0, c1)]
+
+    def tile(self, level, ti, tj):
+        size = self.tile_size
+        return self.levels[level][ti * size:(ti + 1) * size, tj * size:(tj + 1) * size]
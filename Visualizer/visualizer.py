@@ -1,13 +1,17 @@
 import numpy as np
-from PyQt6 import QtWidgets
+from PyQt6 import QtCore, QtWidgets
 
-from Visualizer.funcWrapper import FunctionalityWrapper
+from Visualizer.funcWrapper import FunctionalityWrapper, render_snapshot
+from Visualizer.tiles import CODE_LEVELS, TilePyramid
 from Visualizer.utils import Utils
 
 from vispy.scene import SceneCanvas, visuals
 from vispy.visuals.transforms import STTransform
 
 CANVAS_SIZE = (1000, 1000)  # (width, height)
+# on-screen size of a cell in pixels below which grid lines and pin/via labels are hidden
+GRID_LINES_MIN_PIXELS = 4
+LABELS_MIN_PIXELS = 24
 
 COLORMAP_CHOICES = ["viridis", "hot", "grays", "reds", "blues"]
 LAYER_CHOICES = ["Layer 0", "Layer 1", "Combined"]
@@ -42,6 +46,8 @@ class MyMainWindow(QtWidgets.QMainWindow):
         self._controls.testcase_chooser.currentTextChanged.connect(self._canvas_wrapper.set_testcase_and_redraw)
         self._controls.layer_chooser.currentTextChanged.connect(self._canvas_wrapper.set_active_layer_and_redraw)
         self._controls.grid_checkbox.stateChanged.connect(self._canvas_wrapper.toggle_grid_visibility)
+        self._controls.cancel_button.clicked.connect(self._canvas_wrapper.cancel_routing)
+        self._canvas_wrapper.on_routing_progress = self._controls.show_routing_progress
 
 class Controls(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -72,163 +78,321 @@ class Controls(QtWidgets.QWidget):
         self.coord_label = QtWidgets.QLabel()
         layout.addWidget(self.coord_label)
 
+        self.routing_progress = QtWidgets.QProgressBar()
+        self.routing_progress.setVisible(False)
+        layout.addWidget(self.routing_progress)
+        self.cancel_button = QtWidgets.QPushButton("Cancel Routing")
+        self.cancel_button.setVisible(False)
+        layout.addWidget(self.cancel_button)
+
         layout.addStretch(1)
         self.setLayout(layout)
 
+    def show_routing_progress(self, routed, total):
+        # a total of 0 hides the progress widgets once routing finished or was cancelled
+        routing = total > 0
+        self.routing_progress.setVisible(routing)
+        self.cancel_button.setVisible(routing)
+        if routing:
+            self.routing_progress.setRange(0, total)
+            self.routing_progress.setValue(routed)
+
+class RoutingWorker(QtCore.QThread):
+    """Routes a FunctionalityWrapper.snapshot() off the GUI thread, never touching the wrapper itself"""
+    progress = QtCore.pyqtSignal(int, int)
+    # the snapshot's render key and its render_snapshot() result, None when cancelled
+    rendered = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, snapshot, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.key = snapshot[0]
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        def report(routed, total):
+            self.progress.emit(routed, total)
+            return not self._cancelled
+
+        self.rendered.emit(self.key, render_snapshot(self.snapshot, report))
+
+class TiledImage:
+    """Draws a TilePyramid as one Image visual per tile in view, at the level matching the zoom
+
+    Only the visible tiles of one level are uploaded as textures, so grids beyond the GPU
+    texture size limit can be shown.
+    """
+
+    def __init__(self, parent, cmap, order=0, opacity=1.0, translucent=False):
+        self.parent = parent
+        self.cmap = cmap
+        self.order = order
+        self.opacity = opacity
+        self.translucent = translucent
+        self.pyramid = None
+        self._tiles = {}
+
+    def set_pyramid(self, pyramid):
+        if pyramid is not self.pyramid:
+            self.clear()
+            self.pyramid = pyramid
+
+    def clear(self):
+        for image in self._tiles.values():
+            image.parent = None
+        self._tiles = {}
+        self.pyramid = None
+
+    def set_cmap(self, cmap):
+        self.cmap = cmap
+        for image in self._tiles.values():
+            image.cmap = cmap
+
+    def update(self, rect, cell_pixels):
+        if self.pyramid is None:
+            return
+        level = self.pyramid.level_for(cell_pixels)
+        wanted = set(self.pyramid.visible_tiles(level, rect.left, rect.right, rect.bottom, rect.top))
+
+        for key in list(self._tiles):
+            if key not in wanted:
+                self._tiles.pop(key).parent = None
+
+        for key in wanted - set(self._tiles):
+            level, ti, tj = key
+            scale = 2 ** level
+            span = self.pyramid.tile_size * scale
+            image = visuals.Image(
+                CODE_LEVELS[self.pyramid.tile(*key)],
+                texture_format="auto",
+                interpolation="nearest",
+                cmap=self.cmap,
+                clim=(0, CODE_LEVELS[-1]),
+                parent=self.parent,
+            )
+            image.transform = STTransform(scale=(scale, scale), translate=(tj * span, ti * span))
+            image.order = self.order
+            if self.translucent:
+                # configure opengl blend mode for proper compositing
+                image.opacity = self.opacity
+                image.set_gl_state('translucent', depth_test=False, cull_face=False, blend=True,
+                                   blend_func=('src_alpha', 'one_minus_src_alpha'))
+            self._tiles[key] = image
+
 class CanvasWrapper:
     _is_choosing_pin = False
     _active_layer : int = 0
-    _overlayed_image = None
     _chosen_cmap = COLORMAP_CHOICES[0]
-    _show_grid = True
+    _show_grid = False
     _image_shape = (10,10)
 
     def __init__(self):
+        self._worker = None
+        # cancelled workers still finishing their current net, referenced until their thread ends
+        self._retired_workers = set()
+        # called with (routed, total) while routing in the background, (0, 0) once done
+        self.on_routing_progress = None
         self.canvas = SceneCanvas(size=CANVAS_SIZE)
         self.grid = self.canvas.central_widget.add_grid()
         self.view_top = self.grid.add_view(0, 0, bgcolor='gray')
 
         self.funcWrapper = FunctionalityWrapper()
 
-        initial_data = np.zeros((1, 1), dtype=np.float32) # placeholder
-        self.image = visuals.Image(
-            initial_data,
-            texture_format="auto",
-            interpolation="nearest",
-            cmap=self._chosen_cmap,
-            parent=self.view_top.scene,
-        )
-        self._pin_text_visuals = []
-        self._grid_lines = []
+        self.image = TiledImage(self.view_top.scene, self._chosen_cmap)
+        # layer 1 drawn second over layer 0 in the combined view
+        self._overlayed_image = TiledImage(self.view_top.scene, self._chosen_cmap, order=1, opacity=0.8,
+                                           translucent=True)
+        # pyramid of each layer of the visual grid they were built from
+        self._pyramid_source = None
+        self._pyramids = {}
+        # every grid line is one segment of a single Line visual, every label one string of a Text visual
+        self._grid_lines = visuals.Line(pos=np.zeros((2, 2), dtype=np.float32), color='white', connect='segments',
+                                        parent=self.view_top.scene)
+        self._grid_lines.order = -1  # Draw above images
+        self._grid_lines.visible = False
+        self._via_labels = visuals.Text(color='#080843', font_size=8, anchor_x='center', anchor_y='center',
+                                        parent=self.view_top.scene)
+        self._pin_labels = visuals.Text(color='black', font_size=8, anchor_x='center', anchor_y='center',
+                                        parent=self.view_top.scene)
+        self._via_labels.order = 1
+        self._pin_labels.order = 1
+        self._has_labels = False
 
         self.funcWrapper.current_testcase = 0
         self.update_image()
 
     def toggle_grid_visibility(self, state):
         self._show_grid = bool(state)
-        visual_grid_3d = self.funcWrapper.update_grid_3d()
-        shape = visual_grid_3d[0].shape
-        self.create_grid_lines(shape)
+        self.create_grid_lines(self._image_shape)
 
     def create_grid_lines(self, shape):
         height, width = shape
 
-        # Remove old grid lines
-        for line in self._grid_lines:
-            line.parent = None
-        self._grid_lines = []
-
         if not self._show_grid:
+            self._grid_lines.visible = False
             return
 
-        # Create vertical grid lines
-        for i in range(width + 1):
-            line = visuals.Line(pos=np.array([[i, 0], [i, height]]),
-                               color='white',
-                               parent=self.view_top.scene)
-            line.order = -1  # Draw above images
-            self._grid_lines.append(line)
-
-        # Create horizontal grid lines
-        for i in range(height + 1):
-            line = visuals.Line(pos=np.array([[0, i], [width, i]]),
-                               color='white',
-                               parent=self.view_top.scene)
-            line.order = -1
-            self._grid_lines.append(line)
-
-    def show_combined_view(self, layer_0_vg, layer_1_vg, pins):
-        self.image.set_data(layer_0_vg)
-        self.image.order = 0
-
-        self._overlayed_image = visuals.Image(
-            layer_1_vg,
-            texture_format="auto",
-            interpolation="nearest",
-            cmap=self._chosen_cmap,
-            parent=self.view_top.scene,
-        )
-        self._overlayed_image.order = 1  # draw the overlayed image second
-
-        # configure opengl blend mode for proper compositing
-        self._overlayed_image.opacity = 0.8
-        self._overlayed_image.set_gl_state('translucent', depth_test=False, cull_face=False, blend=True,
-                                          blend_func=('src_alpha', 'one_minus_src_alpha'))
-
-        self._image_shape = layer_0_vg.shape
-        self.clear_pins_text()
-        self.show_pins_text(pins)
+        # one segment per vertical then per horizontal line
+        xs = np.arange(width + 1, dtype=np.float32)
+        ys = np.arange(height + 1, dtype=np.float32)
+        vertical = np.stack([np.repeat(xs, 2), np.tile([0, height], width + 1)], axis=1)
+        horizontal = np.stack([np.tile([0, width], height + 1), np.repeat(ys, 2)], axis=1)
+        self._grid_lines.set_data(pos=np.concatenate([vertical, horizontal]).astype(np.float32), connect='segments')
+        self.update_level_of_detail()
 
+    def reset_camera(self):
         self.view_top.camera = "panzoom"
         self.view_top.camera.set_range(x=(0, self._image_shape[1]), y=(0, self._image_shape[0]), margin=0)
         self.view_top.camera.aspect = 1
+        # panning and zooming changes the camera transform
+        self.view_top.camera.transform.changed.connect(self.update_level_of_detail)
+        self.update_level_of_detail()
+
+    def update_level_of_detail(self, event=None):
+        # hide grid lines and labels once cells get too small on screen to tell them apart
+        camera = self.view_top.camera
+        if camera is None or not hasattr(camera, "rect") or camera.rect.width <= 0:
+            return
+        cell_pixels = self.view_top.size[0] / camera.rect.width
+        self.image.update(camera.rect, cell_pixels)
+        self._overlayed_image.update(camera.rect, cell_pixels)
+        self._grid_lines.visible = self._show_grid and cell_pixels >= GRID_LINES_MIN_PIXELS
+        labels_visible = self._has_labels and cell_pixels >= LABELS_MIN_PIXELS
+        self._via_labels.visible = labels_visible
+        self._pin_labels.visible = labels_visible
+
+    def layer_pyramid(self, visual_grid_3d, layer):
+        # built once per layer of a rendered testcase
+        if visual_grid_3d is not self._pyramid_source:
+            self._pyramid_source = visual_grid_3d
+            self._pyramids = {}
+        if layer not in self._pyramids:
+            self._pyramids[layer] = TilePyramid(visual_grid_3d[layer])
+        return self._pyramids[layer]
+
+    def show_combined_view(self, visual_grid_3d, pins):
+        self.image.set_pyramid(self.layer_pyramid(visual_grid_3d, 0))
+        self._overlayed_image.set_pyramid(self.layer_pyramid(visual_grid_3d, 1))
+
+        self._image_shape = visual_grid_3d.shape[1:]
+        self.clear_pins_text()
+        self.show_pins_text(pins)
+
+        self.reset_camera()
 
-    def show_single_view(self, layer, pins):
-        self._image_shape = layer.shape
-        self.image.set_data(layer)
+    def show_single_view(self, visual_grid_3d, layer, pins):
+        self._image_shape = visual_grid_3d.shape[1:]
+        self.image.set_pyramid(self.layer_pyramid(visual_grid_3d, layer))
+        self._overlayed_image.clear()
 
         self.clear_pins_text()
         self.show_pins_text(pins)
 
-        self.view_top.camera = "panzoom"
-        self.view_top.camera.set_range(x=(0, self._image_shape[1]), y=(0, self._image_shape[0]), margin=0)
-        self.view_top.camera.aspect = 1
+        self.reset_camera()
 
     def update_image(self):
-        if self._overlayed_image is not None:
-            self._overlayed_image.parent = None
-            self._overlayed_image = None
-
         # have funcWrapper update its member attributes
-        self.funcWrapper.init_testcase()
+        self.funcWrapper.load_testcase()
+
+        # a layer change while the same testcase is routing is drawn once routing finishes,
+        # routing for anything else is cancelled and left to finish its current net on its own
+        if self._worker is not None and self._worker.isRunning():
+            if self._worker.key == self.funcWrapper.render_key():
+                return
+            self.cancel_routing()
+            self._retire(self._worker)
+        self._worker = None
+
+        visual_grid_3d = self.funcWrapper.cached_render()
+        if visual_grid_3d is not None:
+            self.draw(visual_grid_3d)
+            return
 
-        # if it is Combined view get the two visual grids of our layers and pass it to show_combined view
-        # Do not render if the grid is not multilayer and tries accessing other layer
-        # Ideally we should lock the choices in the UI using QT but whatever this is Q&D
-        if self._active_layer == -1:
-            visual_grid_3d = self.funcWrapper.update_grid_3d()
-            pins = self.funcWrapper.pins
+        # route a copy of the testcase on a worker thread so the window stays responsive
+        worker = RoutingWorker(self.funcWrapper.snapshot())
+
+        # signals of a worker replaced by a newer one are ignored
+        def on_progress(routed, total):
+            if worker is self._worker:
+                self._report_progress(routed, total)
+
+        def on_rendered(key, render):
+            if worker is self._worker:
+                self._on_rendered(key, render)
+
+        worker.progress.connect(on_progress)
+        worker.rendered.connect(on_rendered)
+        self._worker = worker
+        self._report_progress(0, len(self.funcWrapper.nets))
+        worker.start()
+
+    def cancel_routing(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def _retire(self, worker):
+        self._retired_workers.add(worker)
+        worker.finished.connect(lambda: self._retired_workers.discard(worker))
 
-            self.show_combined_view(visual_grid_3d[0], visual_grid_3d[1], pins)
+    def _report_progress(self, routed, total):
+        if self.on_routing_progress is not None:
+            self.on_routing_progress(routed, total)
+
+    def _on_rendered(self, key, render):
+        # runs on the GUI thread, the only place renders are stored and drawn
+        self._report_progress(0, 0)
+        if render is None:
+            return
+        self.funcWrapper.store_render(key, render)
+        if key == self.funcWrapper.render_key():
+            self.draw(self.funcWrapper.cached_render())
+
+    def draw(self, visual_grid_3d):
+        previous_shape = self._image_shape
+        pins = self.funcWrapper.pins
+
+        # if it is Combined view pass the two visual grids of our layers to show_combined view
+        if self._active_layer == -1:
+            self.show_combined_view(visual_grid_3d, pins)
         else:
-            visual_grid_3d = self.funcWrapper.update_grid_3d()
-            pins = self.funcWrapper.pins
-            self.show_single_view(visual_grid_3d[self._active_layer], pins)
+            self.show_single_view(visual_grid_3d, self._active_layer, pins)
+
+        if self._image_shape != previous_shape:
+            self.create_grid_lines(self._image_shape)
 
     def clear_pins_text(self):
-        for visual in self._pin_text_visuals:
-            visual.parent = None
-        self._pin_text_visuals = []
+        self._has_labels = False
+        self._via_labels.visible = False
+        self._pin_labels.visible = False
 
     def show_pins_text(self, pins):
-        for i, via in enumerate(self.funcWrapper.vias):
-            x, y = via
-            via_text = visuals.Text(f'V{y},{x}', pos=(y+0.5, x+0.8), color='#080843',
-                                font_size=8, anchor_x='center', anchor_y='center',
-                                parent=self.view_top.scene)
-            via_text.order = 1
-            self._pin_text_visuals.append(via_text)
-
-        for i, pin in enumerate(pins):
-            l, x, y = pin
-            pin_text = visuals.Text(f'P{l},{y},{x}', pos=(y+0.5, x+0.5), color='black',
-                                font_size=8, anchor_x='center', anchor_y='center',
-                                parent=self.view_top.scene)
-            pin_text.order = 1
-            self._pin_text_visuals.append(pin_text)
+        vias = self.funcWrapper.vias
+        if vias:
+            self._via_labels.text = [f'V{y},{x}' for x, y in vias]
+            self._via_labels.pos = [(y + 0.5, x + 0.8) for x, y in vias]
+        else:
+            self._via_labels.text = ''
+        if pins:
+            self._pin_labels.text = [f'P{l},{y},{x}' for l, x, y in pins]
+            self._pin_labels.pos = [(y + 0.5, x + 0.5) for l, x, y in pins]
+        else:
+            self._pin_labels.text = ''
+        self._has_labels = True
+        self.update_level_of_detail()
 
     def set_image_colormap(self, cmap_name: str):
         print(f"Changing image colormap to {cmap_name}")
         self._chosen_cmap = cmap_name
-        self.image.cmap = cmap_name
-        if self._overlayed_image is not None:
-            self._overlayed_image.cmap = cmap_name
+        self.image.set_cmap(cmap_name)
+        self._overlayed_image.set_cmap(cmap_name)
 
     def set_testcase_and_redraw(self, testcase_no: str):
         print(f"Changing test case to {testcase_no}")
         self.funcWrapper.current_testcase = Utils.testcase_name_to_int(testcase_no)
         self.update_image()
-        self.create_grid_lines(self._image_shape)
 
     def set_active_layer_and_redraw(self, layer_name: str):
         print(f"Changing active layer to {layer_name}")
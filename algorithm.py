@@ -1,8 +1,14 @@
 import numpy as np
 import cProfile, pstats, io
 from pstats import SortKey
+import sys
+import time
+from contextlib import contextmanager
 from collections import deque
 import heapq
+from array import array
+
+from topology import pin_topology
 
 
 # selects the source pin based on distance from the corner (x and y distance following manhattan routing)
@@ -30,7 +36,7 @@ def get_source_pin(pins, rows, cols):
     return closest_pin
 
 def validate_pins(grid, pins):
-    grid = np.array(grid)
+    grid = np.asarray(grid)
     layers, rows, cols = grid.shape
     for pin in pins:
         l, r, c = pin
@@ -39,105 +45,547 @@ def validate_pins(grid, pins):
         if grid[l, r, c] == -1:
             raise ValueError(f"Pin {pin} is located on an obstacle.")
         
+# every cell owns one search state per incoming planar direction (state = node * 2 + direction)
+# sources and via landings seed both states, which prices the next move without a bend
+DIR_H, DIR_V = 0, 1
+
+# costs are integers scaled by COST_SCALE so the 0.1 via tie-break bias stays exact
+COST_SCALE = 10
+
+# heap entries are plain ints holding (cost << _STATE_BITS) | state
+_STATE_BITS = 40
+_STATE_MASK = (1 << _STATE_BITS) - 1
+
+
+def free_cells(grid):
+    """Flat 0/1 byte mask of the routable cells of a (layers, rows, cols) grid"""
+    return (np.asarray(grid) != -1).astype(np.uint8).tobytes()
+
+def cell_to_node(cell, rows, cols):
+    l, r, c = cell
+    return (l * rows + r) * cols + c
+
+def node_to_cell(node, rows, cols):
+    l, rem = divmod(node, rows * cols)
+    r, c = divmod(rem, cols)
+    return (l, r, c)
+
+def move_costs(preferred_directions, direction_cost, via_cost):
+    """Scaled integer costs of a horizontal and vertical step per layer, a bend and a via"""
+    preferred = COST_SCALE
+    non_preferred = int(round(COST_SCALE * direction_cost))
+    h_move = [preferred if d == 'H' else non_preferred for d in preferred_directions]
+    v_move = [preferred if d == 'V' else non_preferred for d in preferred_directions]
+    # the +1 is the 0.1 bias that breaks ties in favour of the non-preferred direction
+    via = int(round(COST_SCALE * via_cost)) + 1
+    return h_move, v_move, non_preferred, via
+
+def _int_array(size, fill, bound):
+    # int32 storage unless the values can outgrow it
+    typecode = 'i' if bound < 2 ** 31 - 1 else 'q'
+    return array(typecode, [fill]) * size
+
+def _free_run(blocked, axis, forward):
+    # free cells in a row after each cell along axis, up to the next blocked cell or the edge
+    size = blocked.shape[axis]
+    index = np.arange(size).reshape([-1 if a == axis else 1 for a in range(blocked.ndim)])
+    if forward:
+        block = np.where(blocked, index, size)
+        nearest = np.flip(np.minimum.accumulate(np.flip(block, axis), axis=axis), axis)
+        after = np.concatenate([np.take(nearest, range(1, size), axis=axis),
+                                np.full_like(np.take(nearest, [0], axis=axis), size)], axis=axis)
+        return after - index - 1
+    block = np.where(blocked, index, -1)
+    nearest = np.maximum.accumulate(block, axis=axis)
+    before = np.concatenate([np.full_like(np.take(nearest, [0], axis=axis), -1),
+                             np.take(nearest, range(size - 1), axis=axis)], axis=axis)
+    return index - before - 1
+
+def straight_runs(free, shape, preferred_directions):
+    """(axes, forward, backward) for search(runs=...): each layer's preferred axis and, per node,
+    the free cells ahead of it along that axis in increasing and decreasing index order"""
+    layers, rows, cols = shape
+    blocked = np.frombuffer(free, dtype=np.uint8).reshape(shape) == 0
+    axes = [DIR_H if direction == 'H' else DIR_V for direction in preferred_directions]
+    forward = np.empty(shape, dtype=np.int32)
+    backward = np.empty(shape, dtype=np.int32)
+    for l, axis in enumerate(axes):
+        # columns change along H, rows along V
+        planar_axis = 1 if axis == DIR_H else 0
+        forward[l] = _free_run(blocked[l], planar_axis, True)
+        backward[l] = _free_run(blocked[l], planar_axis, False)
+    return axes, array('i', forward.tobytes()), array('i', backward.tobytes())
+
+# frontier implementations accepted by search()
+QUEUES = ("heap", "dial")
+
+def cell_lower_bound(costs, target_cells):
+    """Admissible and consistent estimate(l, r, c, d) of the cost from a cell, entered in
+    direction d, to the nearest target cell, and the estimate's largest single-step growth
+
+    Each remaining planar step costs at least the cheapest move, each layer change a via,
+    and on the target's layer a bend is forced whenever a move in the other direction than
+    the state's incoming one is still needed (unless two vias are cheaper than the bend).
+    """
+    h_move, v_move, bend, via = costs
+    min_move = min(min(h_move), min(v_move))
+    bend_bound = min(bend, 2 * via)
+
+    def estimate(l, r, c, d):
+        best = None
+        for tl, tr, tc in target_cells:
+            dx = abs(tc - c)
+            dy = abs(tr - r)
+            dl = abs(tl - l)
+            h = (dx + dy) * min_move + dl * via
+            if dl == 0 and ((dx and d != DIR_H) or (dy and d != DIR_V)):
+                h += bend_bound
+            if best is None or h < best:
+                best = h
+        return best
+
+    return estimate, min_move + bend_bound + via
+
+def lower_bound(costs, target_cells, rows, cols):
+    """cell_lower_bound() over the flat states of search()"""
+    cell_estimate, estimate_step = cell_lower_bound(costs, target_cells)
+    plane = rows * cols
+
+    def estimate(state):
+        node, d = divmod(state, 2)
+        l, rem = divmod(node, plane)
+        r, c = divmod(rem, cols)
+        return cell_estimate(l, r, c, d)
+
+    return estimate, estimate_step
+
+def search(free, shape, sources, targets, costs, queue="heap", astar=False, stats=None, cell_cost=None,
+           warm=None, runs=None):
+    """Dijkstra over (cell, incoming direction) states, (state, cost, pred, pred_dir) of the first target or None
+
+    free: byte mask from free_cells; sources, targets: flat node indices; costs: from move_costs
+    queue: "heap" (binary heap) or "dial" (circular buckets indexed by the integer cost key)
+    astar: order the frontier by cost plus lower_bound() to the targets
+    stats: dict whose "expanded", "popped", "stale", "pushed", "relaxed" (and "carried") counters grow
+    cell_cost: non-negative scaled integer cost per node, added whenever the node is entered
+    warm: dict keeping dist, pred and frontier between calls on the same mask and costs, so a later
+          call only seeds the sources added since and propagates what they improve
+    runs: straight_runs() output, relaxes whole preferred-direction runs per expansion with exact costs
+    """
+    if queue not in QUEUES:
+        raise ValueError(f"Unknown queue {queue!r}, expected one of {QUEUES}")
+
+    layers, rows, cols = shape
+    plane = rows * cols
+    n_states = 2 * layers * plane
+    h_move, v_move, bend, via = costs
+    max_step = max(max(h_move) + bend, max(v_move) + bend, via)
+    if cell_cost is not None:
+        max_step += max(cell_cost)
+    inf = min(n_states * max_step, 2 ** 62)
+
+    if warm is not None and "dist" in warm:
+        dist, pred, pred_dir = warm["dist"], warm["pred"], warm["pred_dir"]
+        resumed = warm.pop("frontier")
+    else:
+        dist = _int_array(n_states, inf, inf)
+        pred = _int_array(n_states, -1, layers * plane)
+        pred_dir = bytearray(n_states)
+        resumed = []
+        if warm is not None:
+            warm.update(dist=dist, pred=pred, pred_dir=pred_dir)
+    pq = []
+    expanded = 0
+    stale = 0
+    carried = 0
+    if runs is not None:
+        run_axes, run_forward, run_backward = runs
+
+    # a key is never more than key_span ahead of the key being expanded,
+    # the estimate is consistent so it only adds its largest single-step growth
+    estimate = None
+    key_span = max_step
+    if astar:
+        estimate, estimate_step = lower_bound(costs, [node_to_cell(t, rows, cols) for t in targets], rows, cols)
+        key_span += estimate_step
+    if runs is not None and queue == "dial":
+        # one expansion queues states up to a whole run ahead
+        key_span *= max(max(run_forward, default=0), max(run_backward, default=0)) + 1
+
+    seeds = []
+    for node in sources:
+        for state in (2 * node + DIR_H, 2 * node + DIR_V):
+            dist[state] = 0
+            pred[state] = -1
+            seeds.append((estimate(state) if estimate else 0, state))
+    # the previous warm search's frontier, keyed again for the current targets, and the targets
+    # it already reached, which may have been expanded while they were not targets yet
+    seeded = {state for _, state in seeds}
+    # the old frontier entries were counted as pushed by the call that queued them
+    requeued = 0
+    if warm is not None:
+        frontier = set(resumed) - seeded
+        resumed = frontier | {state for node in targets for state in (2 * node + DIR_H, 2 * node + DIR_V)
+                              if dist[state] < inf}
+        requeued = len(frontier)
+    for state in set(resumed) - seeded:
+        seeds.append((dist[state] + estimate(state) if estimate else dist[state], state))
+
+    # Dial's buckets: keys pending at once never spread over more than the seed keys
+    # plus key_span, so that many buckets indexed by key modulo their count never collide
+    buckets = None
+    pending = 0
+    cursor = 0
+    if queue == "dial" and seeds:
+        cursor = min(key for key, _ in seeds)
+        n_buckets = max(key for key, _ in seeds) - cursor + key_span + 1
+        buckets = [[] for _ in range(n_buckets)]
+        for key, state in seeds:
+            buckets[key % n_buckets].append(state)
+        pending = len(seeds)
+    elif queue == "heap":
+        pq = [(key << _STATE_BITS) | state for key, state in seeds]
+        heapq.heapify(pq)
+
+    while pq or pending:
+        if buckets is None:
+            item = heapq.heappop(pq)
+            key = item >> _STATE_BITS
+            state = item & _STATE_MASK
+        else:
+            bucket = buckets[cursor % n_buckets]
+            while not bucket:
+                cursor += 1
+                bucket = buckets[cursor % n_buckets]
+            state = bucket.pop()
+            pending -= 1
+            key = cursor
+        cost = dist[state]
+        if key > (cost + estimate(state) if estimate else cost):
+            stale += 1
+            continue
+
+        expanded += 1
+        node, d = divmod(state, 2)
+        if node in targets:
+            if stats is not None:
+                _count_search(stats, expanded, stale, len(seeds), len(pq) + pending, requeued, carried)
+            if warm is not None:
+                # the target was never expanded, so it stays on the frontier
+                frontier = [item & _STATE_MASK for item in pq] if buckets is None else \
+                    [s for bucket in buckets for s in bucket]
+                warm["frontier"] = frontier + [state]
+            return state, cost, pred, pred_dir
+
+        l, rem = divmod(node, plane)
+        r, c = divmod(rem, cols)
+        h_step = cost + h_move[l] + (bend if d == DIR_V else 0)
+        v_step = cost + v_move[l] + (bend if d == DIR_H else 0)
+
+        for nb, nd, step, inside in ((node + 1, DIR_H, h_step, c + 1 < cols),
+                                     (node - 1, DIR_H, h_step, c > 0),
+                                     (node + cols, DIR_V, v_step, r + 1 < rows),
+                                     (node - cols, DIR_V, v_step, r > 0)):
+            if not inside or not free[nb]:
+                continue
+            if runs is not None and nd == run_axes[l]:
+                # walk the free run ahead, each cell entered straight from the one before
+                ahead = nb - node
+                left = (run_forward if ahead > 0 else run_backward)[node] - 1
+                move = h_move[l] if nd == DIR_H else v_move[l]
+                across, turn_move = (cols, v_move[l]) if nd == DIR_H else (1, h_move[l])
+                after, before = (r + 1 < rows, r > 0) if nd == DIR_H else (c + 1 < cols, c > 0)
+                at, prev, came = nb, node, d
+                while True:
+                    if cell_cost is not None:
+                        step += cell_cost[at]
+                    ns = 2 * at + nd
+                    if step >= dist[ns]:
+                        break
+                    dist[ns] = step
+                    pred[ns] = prev
+                    pred_dir[ns] = came
+                    if not left or at in targets:
+                        key = step + estimate(ns) if estimate else step
+                        if buckets is None:
+                            heapq.heappush(pq, (key << _STATE_BITS) | ns)
+                        else:
+                            buckets[key % n_buckets].append(ns)
+                            pending += 1
+                        break
+                    carried += 1
+                    turn = step + turn_move + bend
+                    lift = step + via
+                    for sn, sd, side_step, inside in ((at + across, 1 - nd, turn, after),
+                                                      (at - across, 1 - nd, turn, before),
+                                                      (at + plane, DIR_H, lift, l + 1 < layers),
+                                                      (at + plane, DIR_V, lift, l + 1 < layers),
+                                                      (at - plane, DIR_H, lift, l > 0),
+                                                      (at - plane, DIR_V, lift, l > 0)):
+                        if not inside or not free[sn]:
+                            continue
+                        if cell_cost is not None:
+                            side_step += cell_cost[sn]
+                        ss = 2 * sn + sd
+                        if side_step < dist[ss]:
+                            dist[ss] = side_step
+                            pred[ss] = at
+                            pred_dir[ss] = nd
+                            key = side_step + estimate(ss) if estimate else side_step
+                            if buckets is None:
+                                heapq.heappush(pq, (key << _STATE_BITS) | ss)
+                            else:
+                                buckets[key % n_buckets].append(ss)
+                                pending += 1
+                    prev, at, came = at, at + ahead, nd
+                    step += move
+                    left -= 1
+                continue
+            if cell_cost is not None:
+                step += cell_cost[nb]
+            ns = 2 * nb + nd
+            if step < dist[ns]:
+                dist[ns] = step
+                pred[ns] = node
+                pred_dir[ns] = d
+                key = step + estimate(ns) if estimate else step
+                if buckets is None:
+                    heapq.heappush(pq, (key << _STATE_BITS) | ns)
+                else:
+                    buckets[key % n_buckets].append(ns)
+                    pending += 1
+
+        for nb, inside in ((node + plane, l + 1 < layers), (node - plane, l > 0)):
+            if not inside or not free[nb]:
+                continue
+            step = cost + via
+            if cell_cost is not None:
+                step += cell_cost[nb]
+            # landing on another layer leaves the next move free of a bend
+            for ns in (2 * nb + DIR_H, 2 * nb + DIR_V):
+                if step < dist[ns]:
+                    dist[ns] = step
+                    pred[ns] = node
+                    pred_dir[ns] = d
+                    key = step + estimate(ns) if estimate else step
+                    if buckets is None:
+                        heapq.heappush(pq, (key << _STATE_BITS) | ns)
+                    else:
+                        buckets[key % n_buckets].append(ns)
+                        pending += 1
+
+    if stats is not None:
+        _count_search(stats, expanded, stale, len(seeds), 0, requeued, carried)
+    if warm is not None:
+        warm["frontier"] = []
+    return None
+
+def _count_search(stats, expanded, stale, seeded, queued, requeued=0, carried=0):
+    # derived from counts the search keeps anyway: every entry ever queued was popped (expanded or
+    # stale) or is still queued, the ones not seeded came from relaxations, and requeued of the seeds
+    # are a warm search's old frontier that an earlier call already counted as pushed; carried
+    # states were relaxed and expanded inside a straight run without being queued
+    popped = expanded + stale
+    queued_relaxed = popped + queued - seeded
+    for key, value in (("expanded", expanded + carried), ("popped", popped), ("stale", stale),
+                       ("pushed", seeded - requeued + queued_relaxed), ("relaxed", queued_relaxed + carried)):
+        stats[key] = stats.get(key, 0) + value
+    if carried:
+        stats["carried"] = stats.get("carried", 0) + carried
+
+def trace_path(state, pred, pred_dir, shape):
+    """Walk the predecessor arrays back from state, returns (path, via_locations) from source to target"""
+    layers, rows, cols = shape
+    node = state // 2
+    path = [node_to_cell(node, rows, cols)]
+    via_locations = []
+    while pred[state] >= 0:
+        prev = pred[state]
+        state = 2 * prev + pred_dir[state]
+        cell = node_to_cell(prev, rows, cols)
+        if cell[0] != path[-1][0]:
+            via_locations.append(cell[1:])
+        path.append(cell)
+        node = prev
+    path.reverse()
+    via_locations.reverse()  # Reverse to maintain order from source to target
+    return path, via_locations
+
 # runs dijkstra's algorithm
 def dijkstra(grid, routing_tree, target, preferred_directions, direction_cost, via_cost):
     """Dijkstra for 3D grid with layers"""
+    path, cost, via_locations, _ = dijkstra_multi(grid, routing_tree, {target}, preferred_directions,
+                                                  direction_cost, via_cost)
+    return path, cost, via_locations
+
+# runs a single dijkstra wavefront from the routing tree and stops at the first target it pops
+def dijkstra_multi(grid, routing_tree, targets, preferred_directions, direction_cost, via_cost, queue="heap",
+                   astar=False, stats=None):
+    """Multi-target Dijkstra for 3D grid with layers, returns the path to the cheapest target"""
     layers, rows, cols = grid.shape
-    cost_grid = np.full((layers, rows, cols), np.inf)
-    path = {}
-    direction_grid = np.full((layers, rows, cols), None)
-    pq = []
+    sources = [cell_to_node(cell, rows, cols) for cell in routing_tree]
+    target_nodes = {cell_to_node(cell, rows, cols) for cell in targets}
+    costs = move_costs(preferred_directions, direction_cost, via_cost)
 
-    planar_moves = [
-        ((0, 0, 1), 'H'),   # right
-        ((0, 0, -1), 'H'),  # left
-        ((0, 1, 0), 'V'),   # down
-        ((0, -1, 0), 'V')   # up
-    ]
-    
-    # Initialize pq
-    for cell in routing_tree:
-        cost_grid[cell] = 0
-        direction_grid[cell] = None
-        heapq.heappush(pq, (0, cell, None))
+    found = search(free_cells(grid), grid.shape, sources, target_nodes, costs, queue, astar, stats)
+    if found is None:
+        return [], np.inf, [], None
 
-    found = False
-    
+    state, cost, pred, pred_dir = found
+    path, via_locations = trace_path(state, pred, pred_dir, grid.shape)
+    return path, cost / COST_SCALE, via_locations, path[-1]
 
-    while pq and not found:
-        current_cost, current, prev_dir = heapq.heappop(pq)
-        l, r, c = current
-        
-        if current == target:
-            found = True
+# classic Lee wavefront: every move costs one, each wave is a handful of array shifts
+def lee_wavefront(free, sources, targets, stats=None):
+    """Vectorized Lee BFS on a (layers, rows, cols) boolean grid of routable cells
+
+    All cells one step away from the frontier are labelled with the next wave number at once,
+    the first wave that touches a target stops the search and the path is backtraced through
+    the wave numbers. Returns (path, via_locations, target), or ([], [], None) if no target
+    is reachable. If stats is a dict its "expanded" count grows by the cells labelled and its
+    "trace_seconds" by the backtrace time.
+    """
+    layers, rows, cols = free.shape
+    wave = np.full(free.shape, -1, dtype=np.int32)
+    frontier = np.zeros(free.shape, dtype=bool)
+    is_target = np.zeros(free.shape, dtype=bool)
+    for cell in sources:
+        frontier[cell] = True
+    for cell in targets:
+        is_target[cell] = True
+    wave[frontier] = 0
+
+    hit = frontier & is_target
+    if hit.any():
+        target = tuple(int(v) for v in np.argwhere(hit)[0])
+        return [target], [], target
+
+    # the frontier grows by at most one cell per wave, so only its bounding box is touched
+    rs = [cell[1] for cell in sources]
+    cs = [cell[2] for cell in sources]
+    r0, r1, c0, c1 = min(rs), max(rs), min(cs), max(cs)
+    labelled = 0
+    k = 0
+
+    while True:
+        k += 1
+        r0, r1 = max(r0 - 1, 0), min(r1 + 1, rows - 1)
+        c0, c1 = max(c0 - 1, 0), min(c1 + 1, cols - 1)
+        window = (slice(None), slice(r0, r1 + 1), slice(c0, c1 + 1))
+
+        current = frontier[window]
+        nxt = np.zeros_like(current)
+        nxt[:, :, 1:] |= current[:, :, :-1]
+        nxt[:, :, :-1] |= current[:, :, 1:]
+        nxt[:, 1:, :] |= current[:, :-1, :]
+        nxt[:, :-1, :] |= current[:, 1:, :]
+        nxt[1:] |= current[:-1]
+        nxt[:-1] |= current[1:]
+        nxt &= free[window]
+        nxt &= wave[window] < 0
+
+        if not nxt.any():
             break
-            
-        if current_cost > cost_grid[l, r, c]:
-            continue
-        
-        for (dl, dr, dc), move_dir in planar_moves:
+        wave[window][nxt] = k
+        frontier[window] = nxt
+        labelled += int(np.count_nonzero(nxt))
+
+        hit = nxt & is_target[window]
+        if hit.any():
+            l, r, c = np.argwhere(hit)[0]
+            target = (int(l), int(r) + r0, int(c) + c0)
+            if stats is None:
+                path, via_locations = _lee_backtrace(wave, target)
+            else:
+                stats["expanded"] = stats.get("expanded", 0) + labelled
+                start = time.perf_counter()
+                path, via_locations = _lee_backtrace(wave, target)
+                stats["trace_seconds"] = stats.get("trace_seconds", 0) + time.perf_counter() - start
+            return path, via_locations, target
+
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + labelled
+    return [], [], None
+
+def _lee_backtrace(wave, target):
+    layers, rows, cols = wave.shape
+    moves = [(0, 0, 1), (0, 0, -1), (0, 1, 0), (0, -1, 0), (1, 0, 0), (-1, 0, 0)]
+    path = [target]
+    via_locations = []
+    l, r, c = target
+    k = int(wave[target])
+    last = None
+
+    while k > 0:
+        # keep going straight when possible to avoid needless bends
+        order = [last] + moves if last is not None else moves
+        for dl, dr, dc in order:
             nl, nr, nc = l + dl, r + dr, c + dc
-            
-            if 0 <= nl < layers and 0 <= nr < rows and 0 <= nc < cols:
-                if grid[nl, nr, nc] == -1: 
-                    continue
-                
-                preferred = preferred_directions[l]
-                move_cost = 1 if move_dir == preferred else direction_cost
-                
-                direction_change = prev_dir is not None and move_dir != prev_dir
-                bend_cost = direction_cost if direction_change else 0
-                
-                new_cost = current_cost + move_cost + bend_cost
-                
-                if cost_grid[nl, nr, nc] > new_cost:
-                    cost_grid[nl, nr, nc] = new_cost
-                    path[(nl, nr, nc)] = (l, r, c)
-                    direction_grid[nl, nr, nc] = move_dir
-                    heapq.heappush(pq, (new_cost, (nl, nr, nc), move_dir))
-        
-        for dl in [-1, 1]: 
-            nl = l + dl
-            if 0 <= nl < layers:
-                if grid[nl, r, c] == -1: 
-                    continue
-        
-                # Add a small bias to via cost to break ties in favor of non-preferred direction
-                new_cost = current_cost + via_cost + 0.1
-        
-                if cost_grid[nl, r, c] > new_cost:
-                    cost_grid[nl, r, c] = new_cost
-                    path[(nl, r, c)] = (l, r, c)
-                    direction_grid[nl, r, c] = 'Via'
-                    heapq.heappush(pq, (new_cost, (nl, r, c), None))
-    
-    if found:
-        # Reconstruct path
-        path_copy = [target]
-        via_locations = [] 
-        current = target
-        while current in path:
-            prev = path[current]
-
-            if current[0] != prev[0]:
-                via_locations.append((current[1], current[2]))
-            current = prev
-            path_copy.append(current)
-        path_copy.reverse()
-        via_locations.reverse()  # Reverse to maintain order from source to target
-        return path_copy, cost_grid[target], via_locations
-    else:
-        return [], np.inf, []
+            if 0 <= nl < layers and 0 <= nr < rows and 0 <= nc < cols and wave[nl, nr, nc] == k - 1:
+                break
+        if dl:
+            via_locations.append((r, c))
+        l, r, c = nl, nr, nc
+        last = (dl, dr, dc)
+        path.append((l, r, c))
+        k -= 1
+
+    path.reverse()
+    via_locations.reverse()
+    return path, via_locations
+
+# search windows for a net: its pin bounding box plus a margin that grows until it covers the grid
+def search_windows(cells, rows, cols, margin, growth=2):
+    """Yield (r0, r1, c0, c1) row and column ranges of progressively larger windows, ending with the full grid"""
+    r_lo = min(cell[1] for cell in cells)
+    r_hi = max(cell[1] for cell in cells)
+    c_lo = min(cell[2] for cell in cells)
+    c_hi = max(cell[2] for cell in cells)
 
-def lee_router_multi(grid, pins, direction_cost=3, via_cost=5):
-    """Multi-layer Lee router implementation"""
+    while True:
+        window = (max(r_lo - margin, 0), min(r_hi + margin + 1, rows),
+                  max(c_lo - margin, 0), min(c_hi + margin + 1, cols))
+        yield window
+        if window == (0, rows, 0, cols):
+            return
+        margin = max(int(margin * growth), margin + 1)
+
+# search engines accepted by lee_router_multi
+ENGINES = ("dijkstra", "lee")
+
+def lee_router_multi(grid, pins, direction_cost=3, via_cost=5, multi_target=True, queue="heap", astar=False,
+                     stats=None, engine="dijkstra", window_margin=None, window_growth=2, corridor=None,
+                     max_windows=None, cell_cost=None, warm_start=False, topology=None, jump=False):
+    """Multi-layer Lee router implementation, returns the net's (paths, vias) without modifying grid
+
+    multi_target: grow the tree by one search to the nearest unrouted pin, else one search per pin
+    queue, astar: frontier and A* of search()
+    stats: dict collecting search counters, "searches", "search_seconds", "trace_seconds" and "unrouted" pins
+    engine: "dijkstra" runs search(), "lee" the unit-cost lee_wavefront() ignoring direction and via costs
+    window_margin: search the pin bounding box grown by this margin first, widening to the full grid
+    window_growth: factor the margin grows by after each window without a path
+    corridor: boolean (rows, cols) mask, e.g. from global_router.global_route, for the first attempt
+    max_windows: cap on the windows tried per connection
+    cell_cost: (layers, rows, cols) non-negative extra cost of entering each cell ("dijkstra" only)
+    warm_start: keep each window's search state between the net's connections ("dijkstra" only)
+    topology: "mst" or "steiner", connect the pins in topology.pin_topology() order
+    jump: pass straight_runs() of every window to search() ("dijkstra" only)
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == "lee" and cell_cost is not None:
+        raise ValueError("The unit-cost lee engine does not support cell costs")
+    if engine == "lee" and warm_start:
+        raise ValueError("The unit-cost lee engine does not support warm starts")
+    if engine == "lee" and jump:
+        raise ValueError("The unit-cost lee engine does not support straight-run jumps")
     if len(pins) <= 1:
         return []
     
    # validate pins here
     validate_pins(grid, pins)
 
-    grid = np.array(grid)
+    grid = np.asarray(grid)
     
     if len(grid.shape) == 2:
         rows, cols = grid.shape
@@ -148,6 +596,9 @@ def lee_router_multi(grid, pins, direction_cost=3, via_cost=5):
     
     layers, rows, cols = grid.shape
     
+    # pins come as tuples or as the rows of an integer array from file_handling.input_file
+    pins = [tuple(int(v) for v in pin) for pin in pins]
+
     # Convert 2D pins to 3D if needed
     if len(pins[0]) == 2:
         pins = [(0, r, c) for r, c in pins]
@@ -160,44 +611,167 @@ def lee_router_multi(grid, pins, direction_cost=3, via_cost=5):
         elif l == 1:
             preferred_directions.append('V')  # Layer 1: Vertical
     
+    costs = move_costs(preferred_directions, direction_cost, via_cost)
+
+    # each attempt is a window and whether the corridor restricts the cells inside it
+    corridor_attempts = []
+    if corridor is not None:
+        corridor = np.asarray(corridor, dtype=bool)
+        rs, cs = np.nonzero(corridor)
+        if len(rs):
+            corridor_attempts.append(((int(rs.min()), int(rs.max()) + 1, int(cs.min()), int(cs.max()) + 1), True))
+
+    def attempts_for(cells, margin):
+        attempts = corridor_attempts + [(window, False) for window in search_windows(cells, rows, cols, margin,
+                                                                                       window_growth)]
+        return attempts[:max_windows] if max_windows is not None else attempts
+
+    if window_margin is None:
+        attempts = corridor_attempts + [((0, rows, 0, cols), False)]
+        attempts = attempts[:max_windows] if max_windows is not None else attempts
+    else:
+        attempts = attempts_for(pins, window_margin)
+
+    # the obstacles stay fixed while the tree grows, so each attempt's mask and costs are built once
+    masks = {}
+    window_cell_costs = {}
+    window_runs = {}
+    # per attempt, the warm search state and the tree nodes already seeded into it
+    warm_searches = {}
+    warm_sources = {}
+
+    def routable_cells(attempt):
+        if attempt not in masks:
+            (r0, r1, c0, c1), in_corridor = attempt
+            routable = grid[:, r0:r1, c0:c1] != -1
+            if in_corridor:
+                routable &= corridor[r0:r1, c0:c1]
+            masks[attempt] = routable if engine == "lee" else routable.astype(np.uint8).tobytes()
+        return masks[attempt]
+
+    def window_costs(attempt):
+        if cell_cost is None:
+            return None
+        if attempt not in window_cell_costs:
+            r0, r1, c0, c1 = attempt[0]
+            scaled = np.rint(np.asarray(cell_cost)[:, r0:r1, c0:c1] * COST_SCALE).astype(np.int64)
+            window_cell_costs[attempt] = array('q', scaled.tobytes())
+        return window_cell_costs[attempt]
+
+    def runs_in(attempt):
+        if not jump:
+            return None
+        if attempt not in window_runs:
+            r0, r1, c0, c1 = attempt[0]
+            window_runs[attempt] = straight_runs(routable_cells(attempt), (layers, r1 - r0, c1 - c0),
+                                                 preferred_directions)
+        return window_runs[attempt]
+
+    def connect(targets, attempts=attempts):
+        # cheapest connection from the routing tree to any of targets as (cost, path, vias)
+        for attempt in attempts:
+            found = connect_in(attempt, targets)
+            if found is not None:
+                return found
+        return None
+
+    def connect_in(attempt, targets):
+        r0, r1, c0, c1 = attempt[0]
+        shape = (layers, r1 - r0, c1 - c0)
+        sources = [(l, r - r0, c - c0) for l, r, c in routing_tree if r0 <= r < r1 and c0 <= c < c1]
+        local_targets = {(l, r - r0, c - c0) for l, r, c in targets if r0 <= r < r1 and c0 <= c < c1}
+        if not sources or not local_targets:
+            return None
+
+        if stats is not None:
+            stats["searches"] = stats.get("searches", 0) + 1
+            start = time.perf_counter()
+        if engine == "lee":
+            traced = stats.get("trace_seconds", 0) if stats is not None else 0
+            path, vias, _ = lee_wavefront(routable_cells(attempt), sources, local_targets, stats)
+            if stats is not None:
+                # the backtrace runs inside lee_wavefront and is only counted as trace time
+                backtrace = stats.get("trace_seconds", 0) - traced
+                stats["search_seconds"] = stats.get("search_seconds", 0) + time.perf_counter() - start - backtrace
+            if not path:
+                return None
+            cost = len(path)
+        else:
+            source_nodes = [cell_to_node(cell, *shape[1:]) for cell in sources]
+            warm = None
+            if warm_start:
+                warm = warm_searches.setdefault(attempt, {})
+                seeded = warm_sources.setdefault(attempt, set())
+                source_nodes = [node for node in source_nodes if node not in seeded]
+                seeded.update(source_nodes)
+            found = search(routable_cells(attempt), shape, source_nodes,
+                           {cell_to_node(cell, *shape[1:]) for cell in local_targets}, costs, queue, astar, stats,
+                           window_costs(attempt), warm, runs_in(attempt))
+            if stats is not None:
+                traced = time.perf_counter()
+                stats["search_seconds"] = stats.get("search_seconds", 0) + traced - start
+            if found is None:
+                return None
+            state, cost, pred, pred_dir = found
+            path, vias = trace_path(state, pred, pred_dir, shape)
+            if stats is not None:
+                stats["trace_seconds"] = stats.get("trace_seconds", 0) + time.perf_counter() - traced
+
+        return cost, [(l, r + r0, c + c0) for l, r, c in path], [(r + r0, c + c0) for r, c in vias]
+
     source_pin = get_source_pin(pins, rows, cols)
     routing_tree = set([source_pin])
     all_paths = []
     all_vias = []
     unrouted_pins = set(pins) - {source_pin}
 
+    if topology is not None:
+        # one search per tree edge, windowed around the pin and the region it should join
+        for pin, (r0, r1, c0, c1) in pin_topology(list(dict.fromkeys(pins)), source_pin, topology):
+            edge_attempts = attempts_for([pin, (0, r0, c0), (0, r1, c1)], window_margin or 0)
+            found = connect({pin}, edge_attempts)
+            if found is None:
+                continue
+            _, path, vias = found
+            all_paths.extend([cell for cell in path if cell not in routing_tree])
+            all_vias.extend(vias)
+            routing_tree.update(path)
+            unrouted_pins.remove(pin)
+        if unrouted_pins and stats is not None:
+            stats["unrouted"] = stats.get("unrouted", 0) + len(unrouted_pins)
+        return all_paths, all_vias
+
     while unrouted_pins:
         closest_pin = None
         min_cost = float('inf')
         best_path = None
         
-        for target in unrouted_pins:
-            path, total_cost, vias = dijkstra(grid, routing_tree, target, 
-                                         preferred_directions, direction_cost, via_cost)
-            if path and total_cost < min_cost:
-                min_cost = total_cost
-                closest_pin = target
-                best_path = path
-                best_vias = vias
+        if multi_target:
+            targets = [unrouted_pins]
+        else:
+            targets = [{pin} for pin in unrouted_pins]
+
+        for target_cells in targets:
+            found = connect(target_cells)
+            if found is not None and found[0] < min_cost:
+                min_cost, best_path, best_vias = found
+                closest_pin = best_path[-1]
 
         if closest_pin is None:
+            if stats is not None:
+                stats["unrouted"] = stats.get("unrouted", 0) + len(unrouted_pins)
             return all_paths if all_paths else [], all_vias
 
         all_paths.extend([cell for cell in best_path if cell not in routing_tree])
         all_vias.extend(best_vias)
 
-        for idx, cell in enumerate(best_path):
-            routing_tree.add(cell)
-            l, r, c = cell
-            # Only mark wire on the upper layer (layer 1) if the path is routed there
-            if l == 1 and (l, r, c) not in pins:
-                grid[l, r, c] = 1
+        routing_tree.update(best_path)
         unrouted_pins.remove(closest_pin)
     # print(all_vias)
     return all_paths, all_vias
 
-def lee_router(grid, pins, direction_cost=10, via_cost=50):
-    """Wrapper for backward compatibility"""
+def lee_router(grid, pins, direction_cost=10, via_cost=50, **options):
+    """Wrapper for backward compatibility, options are passed on to lee_router_multi"""
     grid = np.array(grid)
 
     validate_pins(grid, pins)
@@ -205,14 +779,77 @@ def lee_router(grid, pins, direction_cost=10, via_cost=50):
     if len(grid.shape) == 3:
         if len(pins[0]) == 3:
 
-            return lee_router_multi(grid, pins, direction_cost, via_cost)
+            return lee_router_multi(grid, pins, direction_cost, via_cost, **options)
         else:
             pins_3d = [(0, r, c) for r, c in pins]
-            paths_3d, vias = lee_router_multi(grid, pins_3d, direction_cost, via_cost)
+            paths_3d, vias = lee_router_multi(grid, pins_3d, direction_cost, via_cost, **options)
             return [(r, c) for l, r, c in paths_3d]
     else:
         pins_3d = [(0, r, c) for r, c in pins]
-        paths_3d, vias = lee_router_multi(grid, pins_3d, direction_cost, via_cost)
+        paths_3d, vias = lee_router_multi(grid, pins_3d, direction_cost, via_cost, **options)
         return [(r, c) for l, r, c in paths_3d]
-    
-    
+
+# turns a routed net into obstacles for the nets routed after it
+def commit_route(logical_grid_3d, net, paths):
+    for cell in paths:
+        logical_grid_3d[cell] = -1
+    for pin in net:
+        logical_grid_3d[tuple(pin)] = -1
+
+def route_net(logical_grid_3d, net, direction_cost=10, via_cost=50, **options):
+    """Route one net on logical_grid_3d and commit it, returns (paths, vias) or None if its pins are blocked"""
+    try:
+        validate_pins(logical_grid_3d, net)
+    except ValueError:
+        return None
+
+    if len(net) > 1:
+        all_paths, all_vias = lee_router_multi(logical_grid_3d, net, direction_cost, via_cost, **options)
+    else:
+        all_paths, all_vias = [], []
+    commit_route(logical_grid_3d, net, all_paths)
+    return all_paths, all_vias
+
+# routes nets one after another, every routed net becomes an obstacle for the next ones
+def route_nets(grid, nets, direction_cost=10, via_cost=50, corridors=None, progress=None, **options):
+    """Route nets in order the way FunctionalityWrapper.update_grid_3d does
+
+    corridors optionally holds one corridor mask (or None) per net, options are passed on to
+    lee_router_multi. Returns one (paths, vias) per net, or None for a net whose pins sit on
+    an obstacle, e.g. on a wire of an earlier net. progress(routed, total) is called after
+    every net, if it returns False routing stops and only the results so far are returned.
+    """
+    logical_grid_3d = np.array(grid, np.float32)
+    results = []
+
+    for i, net in enumerate(nets):
+        corridor = corridors[i] if corridors is not None else None
+        results.append(route_net(logical_grid_3d, net, direction_cost, via_cost, corridor=corridor, **options))
+        if progress is not None and progress(i + 1, len(nets)) is False:
+            break
+
+    return results
+
+@contextmanager
+def profiled(filename=None, sort=SortKey.CUMULATIVE, limit=30, stream=None):
+    """Run the body of a with block under cProfile
+
+    The raw stats are dumped to filename for pstats or snakeviz if given, otherwise the limit
+    most expensive entries by sort are printed to stream (stdout by default). Yields the
+    profiler.
+
+        with profiled("route.pstats"):
+            route_nets(grid, nets)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if filename is not None:
+            profiler.dump_stats(filename)
+        else:
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(limit)
+            (stream or sys.stdout).write(report.getvalue())
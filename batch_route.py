@@ -0,0 +1,170 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from algorithm import ENGINES, QUEUES, profiled, route_net
+from design_format import save_design
+from file_handling import input_file
+from sparse_grid import read_sparse, route_net_sparse
+from topology import TOPOLOGIES
+
+
+# headless entry point: routes testcase files in a process pool, no GUI modules are imported
+def write_routes(filename, nets, results):
+    """Write every net's pins, routed cells and vias in the (layer, x, y) order of the input files"""
+    with open(filename, "w") as file:
+        for i, (net, result) in enumerate(zip(nets, results)):
+            paths, vias = result if result is not None else ([], [])
+            lines = [
+                (f"net{i + 1}", [f"({l},{c},{r})" for l, r, c in np.asarray(net).tolist()]),
+                (f"route{i + 1}", [f"({l},{c},{r})" for l, r, c in paths]),
+                (f"vias{i + 1}", [f"({c},{r})" for r, c in vias]),
+            ]
+            for label, cells in lines:
+                file.write(" ".join([label, ", ".join(cells)]).rstrip() + "\n")
+
+def route_file(job):
+    """Parse and route one testcase file net by net, returns its JSON summary
+
+    A file that cannot be read, routed or written is summarized by its "error" instead, so
+    one bad file never stops the rest of the batch.
+    """
+    try:
+        return _route_file(*job)
+    except Exception as error:
+        return {"file": job[0], "error": f"{type(error).__name__}: {error}"}
+
+def _route_file(filename, output_dir, direction_cost, via_cost, design, profile, options):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if profile:
+        with profiled(os.path.join(output_dir, f"{stem}.pstats")):
+            return _route_file(filename, output_dir, direction_cost, via_cost, design, False, options)
+
+    # the sparse backend never allocates the full grid, its only search is A* over a heap
+    sparse = options.get("sparse", False)
+    start = time.perf_counter()
+    grid, nets = read_sparse(filename) if sparse else input_file(filename)
+    parse_seconds = time.perf_counter() - start
+
+    logical_grid_3d = grid.copy() if sparse else np.array(grid, np.float32)
+    results = []
+    net_summaries = []
+    for i, net in enumerate(nets):
+        stats = {"expanded": 0}
+        start = time.perf_counter()
+        if sparse:
+            result = route_net_sparse(logical_grid_3d, net, direction_cost, via_cost, stats=stats)
+        else:
+            result = route_net(logical_grid_3d, net, direction_cost, via_cost, stats=stats, **options)
+        seconds = time.perf_counter() - start
+        results.append(result)
+
+        paths, vias = result if result is not None else ([], [])
+        net_summaries.append({
+            "net": i + 1,
+            "pins": len(net),
+            "routed": result is not None and not stats.get("unrouted", 0),
+            "unrouted_pins": len(net) if result is None else stats.get("unrouted", 0),
+            "seconds": seconds,
+            "expanded": stats["expanded"],
+            "wirelength": len(paths),
+            "vias": len(vias),
+            "counters": {key: value for key, value in stats.items() if key not in ("expanded", "unrouted")},
+        })
+
+    write_routes(os.path.join(output_dir, f"{stem}.routes.txt"), nets, results)
+    if design:
+        save_design(os.path.join(output_dir, f"{stem}.design"), grid, nets, results)
+
+    return {
+        "file": filename,
+        "rows": int(grid.shape[1]),
+        "cols": int(grid.shape[2]),
+        "parse_seconds": parse_seconds,
+        "route_seconds": sum(net["seconds"] for net in net_summaries),
+        "wirelength": sum(net["wirelength"] for net in net_summaries),
+        "vias": sum(net["vias"] for net in net_summaries),
+        "failed_nets": sum(not net["routed"] for net in net_summaries),
+        "nets": net_summaries,
+    }
+
+def testcase_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.txt"))))
+        else:
+            files.append(path)
+    return files
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Route testcase files without the GUI")
+    parser.add_argument("inputs", nargs="+", help="testcase files or directories of *.txt testcases")
+    parser.add_argument("--output-dir", default="routes", help="where the <testcase>.routes.txt files go")
+    parser.add_argument("--summary", help="JSON summary file, printed to stdout if not given")
+    parser.add_argument("--design", action="store_true", help="also save a binary <testcase>.design per file")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--non-preferred-cost", type=int, default=10)
+    parser.add_argument("--via-cost", type=int, default=50)
+    parser.add_argument("--engine", choices=ENGINES, default="dijkstra")
+    parser.add_argument("--queue", choices=QUEUES, default="heap")
+    parser.add_argument("--astar", action="store_true")
+    parser.add_argument("--window-margin", type=int, default=None)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=None,
+                        help="connect each net's pins in the order of a Manhattan spanning or Steiner tree")
+    parser.add_argument("--warm-start", action="store_true", help="keep each net's search state between its pins")
+    parser.add_argument("--jump", action="store_true",
+                        help="relax whole preferred-direction runs per expansion instead of one cell at a time")
+    parser.add_argument("--sparse", action="store_true",
+                        help="keep obstacles as row runs and search state per visited tile, "
+                             "for boards too big for dense arrays")
+    parser.add_argument("--profile", action="store_true", help="also dump cProfile stats to <testcase>.pstats")
+    parser.add_argument("--fail-on-unrouted", action="store_true", help="exit with status 1 if any net failed")
+    args = parser.parse_args(argv)
+
+    if args.engine == "lee" and (args.warm_start or args.jump):
+        parser.error("--warm-start and --jump need the dijkstra engine")
+    options = {"engine": args.engine, "queue": args.queue, "astar": args.astar, "window_margin": args.window_margin,
+               "warm_start": args.warm_start, "topology": args.topology, "jump": args.jump}
+    if args.sparse:
+        if args.design or args.engine != "dijkstra" or args.queue != "heap" or args.window_margin is not None \
+                or args.topology or args.warm_start or args.jump:
+            parser.error("--sparse only combines with the cost, output, process and profiling options")
+        options = {"sparse": True}
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(filename, args.output_dir, args.non_preferred_cost, args.via_cost, args.design, args.profile, options)
+            for filename in testcase_files(args.inputs)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.processes) as pool:
+        files = list(pool.map(route_file, jobs))
+    summary = {
+        "non_preferred_cost": args.non_preferred_cost,
+        "via_cost": args.via_cost,
+        "options": options,
+        "wall_seconds": time.perf_counter() - start,
+        "failed_files": [file["file"] for file in files if "error" in file],
+        "files": files,
+    }
+
+    if args.summary:
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+    if summary["failed_files"]:
+        return 1
+    if args.fail_on_unrouted and any(file["failed_nets"] for file in files):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from algorithm import route_nets, QUEUES
+from file_handling import input_file
+from global_router import route_two_level
+from negotiated_router import route_negotiated
+from topology import TOPOLOGIES
+
+
+# script to compare router configurations on the testcases and on a large random grid
+def route_design(grid, nets, direction_cost=10, via_cost=50, two_level=False, negotiated=False, **options):
+    """Route nets in order with algorithm.route_nets, global_router.route_two_level if two_level
+    or negotiated_router.route_negotiated if negotiated
+
+    Returns (wirelength, vias, failed, expanded) where expanded counts the search states
+    popped over all nets.
+    """
+    stats = {"expanded": 0}
+    router = route_two_level if two_level else route_negotiated if negotiated else route_nets
+    results = router(grid, nets, direction_cost, via_cost, stats=stats, **options)
+
+    routed = [result for result in results if result is not None]
+    wirelength = sum(len(paths) for paths, _ in routed)
+    via_count = sum(len(vias) for _, vias in routed)
+    return wirelength, via_count, len(results) - len(routed), stats["expanded"]
+
+def random_design(size=1000, density=0.10, num_nets=2, pins_per_net=5, seed=0):
+    """Seeded equivalent of the GUI's 1000x1000 case 5"""
+    rng = np.random.default_rng(seed)
+    grid = np.zeros((2, size, size), dtype=int)
+    obstacle_indices = rng.choice(size * size, int(density * size * size), replace=False)
+    grid[0].flat[obstacle_indices] = -1
+
+    nets = []
+    while len(nets) < num_nets:
+        pins = []
+        while len(pins) < pins_per_net:
+            r, c = (int(v) for v in rng.integers(0, size, 2))
+            if grid[0, r, c] == 0 and (0, r, c) not in pins:
+                pins.append((0, r, c))
+        nets.append(pins)
+    return grid, nets
+
+def run(name, grid, nets, configs, direction_cost, via_cost):
+    for label, options in configs:
+        start = time.perf_counter()
+        wirelength, vias, failed, expanded = route_design(grid, nets, direction_cost, via_cost, **options)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12} {label:>13} {elapsed:10.3f}s  expanded={expanded} wirelength={wirelength} vias={vias} "
+              f"failed={failed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare router configurations")
+    parser.add_argument("--testcases", default="Testcases", help="directory of testcase files")
+    parser.add_argument("--size", type=int, default=1000, help="side of the random grid, 0 to skip it")
+    parser.add_argument("--queues", nargs="+", default=list(QUEUES), choices=QUEUES)
+    parser.add_argument("--no-astar", action="store_true", help="only run the plain Dijkstra searches")
+    parser.add_argument("--no-lee", action="store_true", help="skip the unit-cost Lee wavefront engine")
+    parser.add_argument("--two-level", action="store_true",
+                        help="also run every configuration with global routing over tiles first")
+    parser.add_argument("--negotiated", action="store_true",
+                        help="also run the Dijkstra configurations with negotiated congestion rip-up and reroute")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="also run the Dijkstra configurations with warm-started searches")
+    parser.add_argument("--jump", action="store_true",
+                        help="also run the Dijkstra configurations relaxing whole preferred-direction runs")
+    parser.add_argument("--topologies", nargs="+", default=[], choices=TOPOLOGIES,
+                        help="also run the Dijkstra configurations connecting pins in these tree orders")
+    parser.add_argument("--window-margin", type=int, default=None,
+                        help="search inside each net's pin bounding box plus this margin first")
+    parser.add_argument("--non-preferred-cost", type=int, default=10)
+    parser.add_argument("--via-cost", type=int, default=50)
+    args = parser.parse_args()
+
+    configs = [(queue, {"queue": queue, "astar": False}) for queue in args.queues]
+    if not args.no_astar:
+        configs += [(f"{queue}+A*", {"queue": queue, "astar": True}) for queue in args.queues]
+    if not args.no_lee:
+        configs.append(("lee", {"engine": "lee"}))
+    if args.window_margin is not None:
+        # otherwise every router keeps its own default
+        for _, options in configs:
+            options["window_margin"] = args.window_margin
+    if args.warm_start:
+        configs += [(f"warm {label}", dict(options, warm_start=True)) for label, options in configs
+                    if options.get("engine") != "lee"]
+    if args.jump:
+        configs += [(f"jump {label}", dict(options, jump=True)) for label, options in configs
+                    if options.get("engine") != "lee" and not options.get("warm_start")]
+    for topology in args.topologies:
+        configs += [(f"{topology} {label}", dict(options, topology=topology)) for label, options in configs
+                    if options.get("engine") != "lee" and "topology" not in options]
+    if args.two_level:
+        configs += [(f"2L {label}", dict(options, two_level=True)) for label, options in configs]
+    if args.negotiated:
+        configs += [(f"PF {label}", dict(options, negotiated=True)) for label, options in configs
+                    if options.get("engine") != "lee" and not options.get("two_level")]
+
+    for filename in sorted(glob.glob(os.path.join(args.testcases, "*.txt"))):
+        grid, nets = input_file(filename)
+        run(os.path.basename(filename), grid, nets, configs, args.non_preferred_cost, args.via_cost)
+
+    if args.size:
+        grid, nets = random_design(args.size)
+        run(f"random{args.size}", grid, nets, configs, args.non_preferred_cost, args.via_cost)
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from algorithm import QUEUES, route_nets
+from file_handling import input_file
+from testCaseGenerator import generate_testcase
+
+
+# script to track router performance over time: sweeps one design parameter at a time around
+# BASE on seeded testcases and compares the timings against a stored baseline
+BASE = {"size": 100, "density": 0.2, "nets": 10, "pins": 3}
+SWEEPS = {
+    "size": [50, 100, 200, 400],
+    "density": [0.05, 0.1, 0.2, 0.3],
+    "nets": [2, 5, 10, 20],
+    "pins": [2, 3, 5, 8],
+}
+# timings compared against the baseline, the others are recorded for the scaling curves only
+TIMED = ("parse_seconds", "route_seconds")
+# slowdowns smaller than this are timer noise whatever the percentage
+NOISE_SECONDS = 0.005
+
+
+def best_time(function, repeats):
+    # shortest of repeats runs, the least disturbed by the rest of the machine
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def measure(params, seed, repeats, direction_cost, via_cost, options):
+    """Time parsing and routing of the seeded testcase for params, returns a JSON record
+
+    Meant to run in a fresh process, whose peak resident memory is recorded as peak_bytes.
+    """
+    size = params["size"]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "case.txt")
+        generate_testcase(filename, size, int(params["density"] * size * size), params["nets"], params["pins"], seed)
+        parse_seconds, (grid, nets) = best_time(lambda: input_file(filename), repeats)
+
+    def route():
+        stats = {"expanded": 0}
+        return route_nets(grid, nets, direction_cost, via_cost, stats=stats, **options), stats
+
+    route_seconds, (results, stats) = best_time(route, repeats)
+    routed = [result for result in results if result is not None]
+    return {
+        "params": params,
+        "parse_seconds": parse_seconds,
+        "route_seconds": route_seconds,
+        # kilobytes on Linux
+        "peak_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "expanded": stats["expanded"],
+        "wirelength": sum(len(paths) for paths, _ in routed),
+        "vias": sum(len(vias) for _, vias in routed),
+    }
+
+def run_suite(sweeps, seed=0, repeats=3, direction_cost=10, via_cost=50, **options):
+    """Measure every sweep point, returns {"<parameter>=<value>": record}"""
+    results = {}
+    # one process per point so peak memory is not carried over, one at a time for quiet timings
+    with ProcessPoolExecutor(1, max_tasks_per_child=1) as pool:
+        for name, values in sweeps.items():
+            for value in values:
+                key = f"{name}={value}"
+                # the base point is shared by all sweeps
+                params = dict(BASE, **{name: value})
+                shared = next((k for k, record in results.items() if record["params"] == params), None)
+                if shared:
+                    results[key] = results[shared]
+                else:
+                    results[key] = pool.submit(measure, params, seed, repeats, direction_cost, via_cost,
+                                               options).result()
+                record = results[key]
+                print(f"{key:>14} parse={record['parse_seconds']:.4f}s route={record['route_seconds']:.4f}s "
+                      f"peak={record['peak_bytes'] / 2 ** 20:.1f}MiB expanded={record['expanded']}")
+    return results
+
+def regressions(results, baseline, tolerance):
+    """(key, metric, baseline, current) of every timing more than tolerance percent slower than the baseline"""
+    slower = []
+    for key, record in results.items():
+        if key not in baseline or baseline[key]["params"] != record["params"]:
+            continue
+        for metric in TIMED:
+            reference = baseline[key][metric]
+            current = record[metric]
+            if current > reference * (1 + tolerance / 100) and current - reference > NOISE_SECONDS:
+                slower.append((key, metric, reference, current))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Router scaling benchmarks with baseline regression checks")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save this run")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=20,
+                        help="percentage a timing may exceed the baseline before the run fails")
+    parser.add_argument("--sweep", nargs="+", choices=list(SWEEPS), default=list(SWEEPS),
+                        help="parameters to sweep")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--queue", choices=QUEUES, default="heap")
+    parser.add_argument("--astar", action="store_true")
+    parser.add_argument("--non-preferred-cost", type=int, default=10)
+    parser.add_argument("--via-cost", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    options = {"queue": args.queue, "astar": args.astar}
+    results = run_suite({name: SWEEPS[name] for name in args.sweep}, args.seed, args.repeats,
+                        args.non_preferred_cost, args.via_cost, **options)
+    # everything besides the sweep that changes the timings
+    options.update(non_preferred_cost=args.non_preferred_cost, via_cost=args.via_cost)
+    with open(args.output, "w") as file:
+        json.dump({"seed": args.seed, "options": options, "results": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("seed") != args.seed or baseline.get("options") != options:
+            print("Baseline was recorded with a different seed or options", file=sys.stderr)
+            return 2
+        slower = regressions(results, baseline["results"], args.tolerance)
+        for key, metric, reference, current in slower:
+            print(f"REGRESSION {key} {metric}: {reference:.4f}s -> {current:.4f}s "
+                  f"(+{100 * (current / reference - 1):.0f}%)", file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from algorithm import route_nets
+from file_handling import input_file
+
+# a design is a directory of .npy arrays, which np.load can memory-map one by one (members
+# of an .npz archive are always read into memory)
+FORMAT_VERSION = 1
+HEADER = "header.json"
+
+
+def concat_rows(groups, width):
+    """Pack ragged groups of int rows into one (n, width) int32 array and int64 offsets
+
+    Group i is rows[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(group) for group in groups])
+    rows = np.zeros((int(offsets[-1]), width), dtype=np.int32)
+    for i, group in enumerate(groups):
+        if len(group):
+            rows[offsets[i]:offsets[i + 1]] = group
+    return rows, offsets
+
+def split_rows(rows, offsets):
+    """Inverse of concat_rows, the groups are views into rows"""
+    return [rows[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+def save_design(path, grid, nets, results=None):
+    """Write grid, nets and optionally the routing results of route_nets to the directory path
+
+    The grid is stored as int8 with -1 on obstacles, nets and routes as int32 rows with
+    int64 offsets per net. results holds one (paths, vias) or None per net.
+    """
+    os.makedirs(path, exist_ok=True)
+    grid = np.asarray(grid)
+    np.save(os.path.join(path, "grid.npy"), -(grid == -1).view(np.int8))
+
+    pins, net_offsets = concat_rows(nets, 3)
+    np.save(os.path.join(path, "pins.npy"), pins)
+    np.save(os.path.join(path, "net_offsets.npy"), net_offsets)
+
+    if results is not None:
+        routed = np.array([result is not None for result in results])
+        cells, cell_offsets = concat_rows([result[0] if result else [] for result in results], 3)
+        vias, via_offsets = concat_rows([result[1] if result else [] for result in results], 2)
+        for name, array in (("routed", routed), ("cells", cells), ("cell_offsets", cell_offsets),
+                            ("vias", vias), ("via_offsets", via_offsets)):
+            np.save(os.path.join(path, f"{name}.npy"), array)
+
+    with open(os.path.join(path, HEADER), "w") as file:
+        json.dump({"version": FORMAT_VERSION, "shape": list(grid.shape), "nets": len(nets),
+                   "routed": results is not None}, file)
+
+def load_design(path, mmap_mode="r"):
+    """Load a design written by save_design, returns (grid, nets, results)
+
+    With the default mmap_mode every array is memory-mapped read-only, so opening a design
+    costs no more than reading its header and the nets, paths and vias are views into the
+    mapped files. results is None if the design was saved without them, otherwise one
+    (paths, vias) or None per net.
+    """
+    with open(os.path.join(path, HEADER)) as file:
+        header = json.load(file)
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported design format version {header.get('version')}")
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    grid = load("grid")
+    nets = split_rows(load("pins"), load("net_offsets"))
+    if not header["routed"]:
+        return grid, nets, None
+
+    routed = load("routed")
+    paths = split_rows(load("cells"), load("cell_offsets"))
+    vias = split_rows(load("vias"), load("via_offsets"))
+    results = [(paths[i], vias[i]) if routed[i] else None for i in range(len(nets))]
+    return grid, nets, results
+
+def convert(text_file, path, route=False, direction_cost=10, via_cost=50, **options):
+    """Convert a testcase in the text format to a design, routing it first if route"""
+    grid, nets = input_file(text_file)
+    results = route_nets(grid, nets, direction_cost, via_cost, **options) if route else None
+    save_design(path, grid, nets, results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a text testcase to a memory-mappable binary design")
+    parser.add_argument("input", help="testcase file in the text format")
+    parser.add_argument("output", help="design directory to write")
+    parser.add_argument("--route", action="store_true", help="also route the nets and store the paths and vias")
+    parser.add_argument("--non-preferred-cost", type=int, default=10)
+    parser.add_argument("--via-cost", type=int, default=50)
+    args = parser.parse_args()
+
+    convert(args.input, args.output, args.route, args.non_preferred_cost, args.via_cost)
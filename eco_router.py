@@ -0,0 +1,184 @@
+import numpy as np
+
+from algorithm import lee_router_multi, validate_pins
+from net_index import NetIndex, bounding_boxes
+
+
+# engineering change orders on a routed design: every cell knows the net using it, so a change
+# only rips up and reroutes the nets it touches and every other route stays as it is
+class IncrementalRouter:
+    """A routed design that reroutes only the nets affected by obstacle and net changes
+
+    Nets are routed in order like algorithm.route_nets, each committed net blocking the
+    following ones, and get ids 1, 2, ... that stay valid when other nets are added or
+    removed. index is a net_index.NetIndex whose owner grid holds for every cell the id of the
+    net whose wire or pin uses it, 0 for free cells and obstacles. options are passed on to
+    lee_router_multi, a window_margin keeps the reroutes local on large grids.
+
+    Every change returns the ids of the nets it rerouted. Freeing cells, by removing obstacles
+    or nets, also retries the nets that are not fully routed and whose pin bounding box, grown
+    by the window_margin option (0 without one), contains a freed cell. A retried net keeps its
+    previous partial route unless the retry connects more pins. stats, if given, collects the
+    search counters of every reroute and the number of nets "rerouted".
+    """
+
+    def __init__(self, grid, nets, direction_cost=10, via_cost=50, stats=None, **options):
+        self.grid = np.array(grid, np.float32)
+        self.index = NetIndex(self.grid.shape)
+        self.owner = self.index.owner
+        self.direction_cost = direction_cost
+        self.via_cost = via_cost
+        self.stats = stats
+        self.options = options
+        self.nets = {}
+        self.results = {}
+        self.unrouted = {}
+        self._next_id = 1
+
+        for net in nets:
+            self._new_net(net)
+        self._reroute(list(self.nets))
+
+    def _new_net(self, pins):
+        net_id = self._next_id
+        self._next_id += 1
+        self.nets[net_id] = [tuple(int(v) for v in pin) for pin in pins]
+        self.results[net_id] = None
+        self.unrouted[net_id] = len(pins)
+        return net_id
+
+    def _route(self, net_id):
+        pins = self.nets[net_id]
+        try:
+            validate_pins(self.grid, pins)
+        except ValueError:
+            # a pin on an obstacle, on another net or off the grid
+            self.results[net_id] = None
+            self.unrouted[net_id] = len(pins)
+            return
+
+        net_stats = {}
+        if len(pins) > 1:
+            all_paths, all_vias = lee_router_multi(self.grid, pins, self.direction_cost, self.via_cost,
+                                                   stats=net_stats, **self.options)
+        else:
+            all_paths, all_vias = [], []
+        cells = all_paths + pins
+        self.index.commit(net_id, cells)
+        self.grid[tuple(np.array(cells).T)] = -1
+        self.results[net_id] = (all_paths, all_vias)
+
+        self.unrouted[net_id] = net_stats.pop("unrouted", 0)
+        if self.stats is not None:
+            for key, value in net_stats.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+
+    def _rip_up(self, net_id):
+        cells = self.index.release(net_id)
+        if cells is not None:
+            self.grid.flat[cells] = 0
+        self.results[net_id] = None
+        self.unrouted[net_id] = len(self.nets[net_id])
+
+    def _reroute(self, net_ids):
+        # route in the given order, each net blocking the ones after it
+        for net_id in net_ids:
+            self._rip_up(net_id)
+        for net_id in net_ids:
+            self._route(net_id)
+        if self.stats is not None:
+            self.stats["rerouted"] = self.stats.get("rerouted", 0) + len(net_ids)
+        return list(net_ids)
+
+    def _retry(self, rows, cols, skip=()):
+        # incomplete nets near freed (row, col) cells, each kept only if it connects more pins
+        net_ids = [net_id for net_id in self.incomplete() if net_id not in skip]
+        if not net_ids or not len(rows):
+            return []
+        margin = self.options.get("window_margin") or 0
+        boxes = bounding_boxes([self.nets[net_id] for net_id in net_ids])
+        boxes += np.array([-margin, margin, -margin, margin])
+        near = ((rows[None, :] >= boxes[:, :1]) & (rows[None, :] < boxes[:, 1:2])
+                & (cols[None, :] >= boxes[:, 2:3]) & (cols[None, :] < boxes[:, 3:])).any(axis=1)
+
+        retried = []
+        for net_id in np.array(net_ids)[near].tolist():
+            before = self.results[net_id], self.unrouted[net_id], self.index.cells(net_id)
+            self._rip_up(net_id)
+            self._route(net_id)
+            if self.unrouted[net_id] < before[1]:
+                retried.append(net_id)
+                continue
+            # no better than before, put the old route back
+            self._rip_up(net_id)
+            self.results[net_id], self.unrouted[net_id], cells = before
+            if len(cells[0]):
+                self.index.commit(net_id, np.stack(cells, axis=1))
+                self.grid[cells] = -1
+        if self.stats is not None:
+            self.stats["rerouted"] = self.stats.get("rerouted", 0) + len(retried)
+        return retried
+
+    def _claim(self, pins):
+        # rip up the nets whose wires run over pins, returns their ids
+        crossed = set()
+        for pin in pins:
+            net_id = int(self.owner[pin])
+            if net_id and pin not in self.nets[net_id]:
+                crossed.add(net_id)
+        for net_id in crossed:
+            self._rip_up(net_id)
+        return sorted(crossed)
+
+    def incomplete(self):
+        """Ids of the nets with a blocked pin or unrouted pins"""
+        return [net_id for net_id in self.nets if self.unrouted[net_id]]
+
+    def routes(self):
+        """(paths, vias) or None per net in id order, like algorithm.route_nets"""
+        return [self.results[net_id] for net_id in sorted(self.nets)]
+
+    def add_obstacles(self, cells):
+        """Block (row, col) cells on both layers like OBS lines, rerouting the nets that used them"""
+        rows, cols = np.asarray(cells, dtype=np.int64).reshape(-1, 2).T
+        hit = self.owner[:, rows, cols]
+        affected = np.unique(hit[hit > 0]).tolist()
+        for net_id in affected:
+            self._rip_up(net_id)
+        self.grid[:, rows, cols] = -1
+        return self._reroute(affected)
+
+    def remove_obstacles(self, cells):
+        """Free (row, col) cells on both layers and retry the unfinished nets around them"""
+        rows, cols = np.asarray(cells, dtype=np.int64).reshape(-1, 2).T
+        # obstacles never have an owner, wires and pins on these cells stay
+        free = self.owner[:, rows, cols] == 0
+        self.grid[:, rows, cols] = np.where(free, 0, -1)
+        return self._retry(rows, cols)
+
+    def add_net(self, pins):
+        """Add and route a net, returns its id
+
+        Nets whose wires run over the new pins are ripped up and rerouted after it.
+        """
+        net_id = self._new_net(pins)
+        crossed = self._claim(self.nets[net_id])
+        self._reroute([net_id] + crossed)
+        return net_id
+
+    def remove_net(self, net_id):
+        """Rip up and forget a net, then retry the unfinished nets around its cells"""
+        freed = self.index.cells(net_id)
+        self._rip_up(net_id)
+        del self.nets[net_id], self.results[net_id], self.unrouted[net_id]
+        return self._retry(freed[1], freed[2])
+
+    def update_net(self, net_id, pins):
+        """Replace a net's pins and reroute it, together with the nets crossing its new pins"""
+        freed = self.index.cells(net_id)
+        self._rip_up(net_id)
+        self.nets[net_id] = [tuple(int(v) for v in pin) for pin in pins]
+        crossed = self._claim(self.nets[net_id])
+        rerouted = self._reroute([net_id] + crossed)
+        # the old route may have freed room for unfinished nets around it
+        return rerouted + self._retry(freed[1], freed[2], skip=rerouted)
@@ -1,44 +1,84 @@
-def input_file(filename):
-    obs = []
+import re
+
+import numpy as np
+
+# obstacle lines are "OBS (x,y)" or "OBS (x,y,layer)", net lines are "netN (layer,x,y), (layer,x,y), ..."
+LAYERED_OBS_LINE = re.compile(rb'^[ \t]*OBS[ \t]*\([ \t]*(\d+)[ \t]*,[ \t]*(\d+)[ \t]*,[ \t]*\d+[ \t]*\)[ \t]*\r?$',
+                              re.IGNORECASE | re.MULTILINE)
+NET_LINE = re.compile(rb'^[ \t]*net\S*[ \t]+(.*?)\r?$', re.IGNORECASE | re.MULTILINE)
+PIN = re.compile(rb'\([ \t]*(\d+)[ \t]*,[ \t]*(\d+)[ \t]*,[ \t]*(\d+)[ \t]*\)')
+# any line that is not a well-formed obstacle, a net or blank
+BAD_LINE = re.compile(rb'^(?!(?:[ \t]*OBS[ \t]*\([ \t]*\d+[ \t]*,[ \t]*\d+[ \t]*(?:,[ \t]*\d+[ \t]*)?\)'
+                      rb'|[ \t]*net\S*[ \t].*|)[ \t]*\r?$).+$', re.IGNORECASE | re.MULTILINE)
+# blanks out everything but digits, so the obstacle lines left in a block read as "x y x y ..."
+DIGITS_ONLY = bytes(c if 48 <= c < 58 else 32 for c in range(256))
+
+# bytes read per block, which bounds the memory used on top of the grid
+CHUNK_SIZE = 1 << 24
+
+
+def read_header(file, filename):
+    """(rows, cols) from the 'ROWSxCOLS' first line of an open testcase file"""
+    header = file.readline().strip().lower().split(b'x')
+    if len(header) != 2:
+        raise ValueError(f"{filename}: expected a 'ROWSxCOLS' header")
+    rows, cols = map(int, header)
+    return rows, cols
+
+def read_blocks(file, filename, rows, cols, chunk_size=CHUNK_SIZE):
+    """Parse the rest of an open testcase file a block of lines at a time
+
+    Yields (nets, x, y) per block: the nets whose lines are in the block, as (pins, 3) integer
+    arrays of (layer, y, x) pins, and the int64 column and row arrays of its obstacles.
+    Raises ValueError on a malformed line or on an obstacle outside the grid.
+    """
+    rest = b''
+    while True:
+        block = file.read(chunk_size)
+        # parse whole lines only, a partial last line waits for the next block
+        data = rest + block
+        end = len(data) if not block else data.rfind(b'\n') + 1
+        data, rest = data[:end], data[end:]
+
+        bad = BAD_LINE.search(data)
+        if bad:
+            raise ValueError(f"{filename}: malformed line {bad.group().decode(errors='replace')!r}")
+
+        nets = []
+        for pins in NET_LINE.findall(data):
+            pin_fields = PIN.findall(pins)
+            if not pin_fields or PIN.sub(b'', pins).strip(b' \t,'):
+                raise ValueError(f"{filename}: malformed net line {pins.decode(errors='replace')!r}")
+            # file pins are (layer, x, y), the router works in (layer, y, x)
+            nets.append(np.array(pin_fields).astype(np.int64)[:, [0, 2, 1]])
+
+        # obstacles apply to all layers, a layer given on an OBS line is ignored
+        data = LAYERED_OBS_LINE.sub(rb'\1 \2', data)
+        numbers = NET_LINE.sub(b'', data).translate(DIGITS_ONLY).strip()
+        obstacles = np.fromstring(numbers, dtype=np.int64, sep=' ') if numbers else np.empty(0, dtype=np.int64)
+        x, y = obstacles[0::2], obstacles[1::2]
+        if len(x) and (x.max() >= cols or y.max() >= rows):
+            raise ValueError(f"{filename}: obstacle outside the {rows}x{cols} grid")
+        yield nets, x, y
+
+        if not block:
+            break
+
+def input_file(filename, chunk_size=CHUNK_SIZE):
+    """Read a testcase file in one streaming pass without evaluating any of its text
+
+    Returns (grid, nets): grid is a (2, rows, cols) int8 array with -1 on obstacles, each net
+    is a (pins, 3) integer array of (layer, y, x) pins. Obstacles are parsed a block of
+    lines at a time straight into the grid. Raises ValueError on a malformed header or line,
+    or on an obstacle outside the grid.
+    """
     nets = []
-    multiLayer = True
-
-    with open(filename, "r") as file:
-        lines = file.readlines()
-
-    rows, cols = map(int, lines[0].strip().lower().split('x'))
-
-    # Extract obstacles
-    for x in lines[1:]:
-        if x.upper().startswith("OBS"):
-            y = x.strip().split('OBS')[-1]
-            tup = eval(y)
-
-            obs.append((tup[1], tup[0]))
-    
-    # Extract nets
-    for z in lines[1:]:
-        if z.lower().startswith('net'):
-            z = z.strip()
-            tuples = z.split(' ', 1)
-            sub_net = tuples[1]
-            # Parse as (layer, x, y) and convert to (layer, y, x)
-            raw_tuples = eval(f'[{sub_net}]')
-            list_of_tuples = [(t[0], t[2], t[1]) for t in raw_tuples]  # (layer, y, x)
-            nets.append(list_of_tuples)
-
-    grids = []
-    num_grids = 2 if multiLayer else 1
-
-    for _ in range(num_grids):
-        grids.append([[0] * cols for _ in range(rows)])
-
-    if num_grids == 2:
-        for y, x in obs:
-            grids[0][y][x] = -1
-            grids[1][y][x] = -1
-    elif num_grids == 1:
-        for x, y in obs:
-            grids[0][y][x] = -1
-
-    return grids, nets
+
+    with open(filename, "rb") as file:
+        rows, cols = read_header(file, filename)
+        grid = np.zeros((2, rows, cols), dtype=np.int8)
+        for block_nets, x, y in read_blocks(file, filename, rows, cols, chunk_size):
+            nets.extend(block_nets)
+            grid[:, y, x] = -1
+
+    return grid, nets
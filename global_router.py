@@ -0,0 +1,127 @@
+import heapq
+
+import numpy as np
+
+from algorithm import route_nets
+
+# extra cost per track a tile is over its capacity
+OVERFLOW_COST = 10
+
+
+# picks a tile size that keeps the tile graph around 64 tiles across
+def default_tile_size(rows, cols):
+    return max(8, round(max(rows, cols) / 64))
+
+def tile_capacities(grid, tile_size):
+    """Routing capacity of every tile: one track per layer per cell of tile width, scaled by its free fraction"""
+    blocked = np.asarray(grid) == -1
+    layers, rows, cols = blocked.shape
+    t_rows = -(-rows // tile_size)
+    t_cols = -(-cols // tile_size)
+
+    # pad to whole tiles, padding cells count as neither free nor blocked
+    padded = np.zeros((layers, t_rows * tile_size, t_cols * tile_size), dtype=np.int32)
+    inside = np.zeros_like(padded)
+    padded[:, :rows, :cols] = blocked
+    inside[:, :rows, :cols] = 1
+    shape = (layers, t_rows, tile_size, t_cols, tile_size)
+    blocked_count = padded.reshape(shape).sum(axis=(0, 2, 4))
+    cell_count = inside.reshape(shape).sum(axis=(0, 2, 4))
+
+    density = blocked_count / cell_count
+    return np.floor(layers * tile_size * (1 - density)).astype(np.int32)
+
+def route_tiles(capacity, usage, tiles):
+    """Connect tiles over the tile graph, growing a tree one nearest tile at a time
+
+    Entering a tile costs 1 plus its usage relative to capacity, and OVERFLOW_COST per track
+    it is over capacity. Fully blocked tiles can only be entered as targets. Returns the set of
+    tiles in the tree, unreachable tiles are left out.
+    """
+    t_rows, t_cols = capacity.shape
+    tiles = sorted(tiles)
+    tree = {tiles[0]}
+    remaining = set(tiles[1:])
+
+    while remaining:
+        dist = {tile: 0 for tile in tree}
+        prev = {}
+        pq = [(0, tile) for tile in tree]
+        heapq.heapify(pq)
+        found = None
+
+        while pq:
+            cost, tile = heapq.heappop(pq)
+            if cost > dist[tile]:
+                continue
+            if tile in remaining:
+                found = tile
+                break
+            r, c = tile
+            for nxt in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)):
+                if not (0 <= nxt[0] < t_rows and 0 <= nxt[1] < t_cols):
+                    continue
+                cap = capacity[nxt]
+                if cap <= 0 and nxt not in remaining:
+                    continue
+                used = usage[nxt]
+                step = 1 + used / max(cap, 1) + OVERFLOW_COST * max(used - cap + 1, 0)
+                if cost + step < dist.get(nxt, float('inf')):
+                    dist[nxt] = cost + step
+                    prev[nxt] = tile
+                    heapq.heappush(pq, (cost + step, nxt))
+
+        if found is None:
+            break
+        remaining.remove(found)
+        while found not in tree:
+            tree.add(found)
+            found = prev[found]
+
+    return tree
+
+def corridor_mask(tiles, tile_size, rows, cols, margin=1):
+    """Boolean (rows, cols) mask of the cells in tiles, dilated by margin tiles"""
+    t_rows = -(-rows // tile_size)
+    t_cols = -(-cols // tile_size)
+    mask = np.zeros((t_rows, t_cols), dtype=bool)
+    for tile in tiles:
+        mask[tile] = True
+
+    for _ in range(margin):
+        grown = mask.copy()
+        grown[1:] |= mask[:-1]
+        grown[:-1] |= mask[1:]
+        grown[:, 1:] |= mask[:, :-1]
+        grown[:, :-1] |= mask[:, 1:]
+        mask = grown
+
+    return np.repeat(np.repeat(mask, tile_size, axis=0), tile_size, axis=1)[:rows, :cols]
+
+def global_route(grid, nets, tile_size=None, margin=1):
+    """Route every net over the tile graph in order, returns one corridor mask per net"""
+    layers, rows, cols = np.shape(grid)
+    if tile_size is None:
+        tile_size = default_tile_size(rows, cols)
+
+    capacity = tile_capacities(grid, tile_size)
+    usage = np.zeros_like(capacity)
+    corridors = []
+
+    for net in nets:
+        tiles = {(pin[1] // tile_size, pin[2] // tile_size) for pin in net}
+        tree = route_tiles(capacity, usage, tiles)
+        for tile in tree:
+            usage[tile] += 1
+        corridors.append(corridor_mask(tree, tile_size, rows, cols, margin))
+
+    return corridors
+
+def route_two_level(grid, nets, direction_cost=10, via_cost=50, tile_size=None, margin=1, **options):
+    """Global routing over tiles followed by detailed routing inside each net's tile corridor
+
+    Takes and returns the same as algorithm.route_nets, a net that cannot be routed inside
+    its corridor is retried on the full grid.
+    """
+    corridors = global_route(grid, nets, tile_size, margin)
+    return route_nets(grid, nets, direction_cost, via_cost, corridors=corridors, **options)
@@ -0,0 +1,128 @@
+import numpy as np
+
+from algorithm import lee_router_multi
+
+
+# PathFinder-style negotiated congestion: nets may share cells while they negotiate, the
+# shared cells get more expensive every pass until each cell is used by at most one net
+def route_negotiated(grid, nets, direction_cost=10, via_cost=50, max_iterations=30, present_factor=0.5,
+                     present_growth=1.5, history_factor=1.0, patience=3, window_margin=10, astar=True, stats=None,
+                     **options):
+    """Route nets with negotiated congestion instead of turning each routed net into an obstacle
+
+    Entering a cell used by n other nets costs present_factor * n on top of the move, plus
+    the cell's history cost, which grows by history_factor per net of overuse after every
+    pass. The first pass routes every net, each later pass rips up and reroutes only the nets
+    on overused cells with a present_factor multiplied by present_growth. The passes stop when
+    no cell is overused, after max_iterations, or once patience passes in a row have not
+    lowered the total overuse below its best so far. Every search runs A* (astar) inside the
+    net's pin bounding box grown by window_margin first, so a reroute only widens to the full
+    grid when the window has no path; window_margin=None searches the full grid right away.
+    Pins of other nets are never entered. Nets
+    still sharing cells after the last pass are ripped up and routed again in order against
+    every other wire, like algorithm.route_nets, so the returned routes never share a cell.
+
+    Returns one (paths, vias) per net like algorithm.route_nets, or None for a net whose pins
+    sit on an obstacle. If stats is a dict it receives the number of "iterations" run, the
+    number of cells "overused" after the last pass, the nets "legalized" by routing them in
+    order and the search counters of lee_router_multi, with "unrouted" counted over the
+    final routes only.
+    """
+    # static obstacles plus every pin, a net's own pins are opened while it is routed
+    blocked = np.array(grid, np.float32)
+    blocked[blocked != -1] = 0
+    pin_sets = [{tuple(int(v) for v in pin) for pin in net} for net in nets]
+    valid = []
+    for pins in pin_sets:
+        valid.append(all(blocked[pin] != -1 for pin in pins))
+    for pins in pin_sets:
+        for pin in pins:
+            blocked[pin] = -1
+
+    occupancy = np.zeros(blocked.shape, dtype=np.int32)
+    history = np.zeros(blocked.shape, dtype=np.float64)
+    wires = [set() for _ in nets]
+    unrouted = [0] * len(nets)
+    results = [None] * len(nets)
+
+    def reroute(i, legal=None):
+        # with legal, a grid blocking every other wire, the net is routed without sharing
+        pins = list(pin_sets[i])
+        for cell in wires[i]:
+            occupancy[cell] -= 1
+
+        target = blocked if legal is None else legal
+        for pin in pins:
+            target[pin] = 0
+        cell_cost = history + present_factor * occupancy if legal is None else None
+        net_stats = {}
+        if len(pins) > 1:
+            all_paths, all_vias = lee_router_multi(target, pins, direction_cost, via_cost, astar=astar,
+                                                   stats=net_stats, window_margin=window_margin,
+                                                   cell_cost=cell_cost, **options)
+        else:
+            all_paths, all_vias = [], []
+        for pin in pins:
+            target[pin] = -1
+        if legal is not None:
+            for cell in all_paths:
+                legal[cell] = -1
+
+        wires[i] = set(all_paths) - pin_sets[i]
+        for cell in wires[i]:
+            occupancy[cell] += 1
+        results[i] = (all_paths, all_vias)
+
+        # only the last route of a net counts towards its unrouted pins
+        unrouted[i] = net_stats.pop("unrouted", 0)
+        if stats is not None:
+            for key, value in net_stats.items():
+                stats[key] = stats.get(key, 0) + value
+
+    to_route = [i for i in range(len(nets)) if valid[i]]
+    iterations = 0
+    best_overuse = None
+    stalled = 0
+    while to_route and iterations < max_iterations:
+        iterations += 1
+        for i in to_route:
+            reroute(i)
+
+        overused = occupancy > 1
+        if not overused.any():
+            break
+        # the history keeps growing on cells no net can avoid, so stop negotiating once it stops paying off
+        overuse = int(np.sum(occupancy[overused] - 1))
+        if best_overuse is None or overuse < best_overuse:
+            best_overuse = overuse
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= patience:
+                break
+        history[overused] += history_factor * (occupancy[overused] - 1)
+        present_factor *= present_growth
+        to_route = [i for i in range(len(nets)) if any(overused[cell] for cell in wires[i])]
+
+    overused = occupancy > 1
+    overused_cells = int(np.count_nonzero(overused))
+    offenders = [i for i in range(len(nets)) if any(overused[cell] for cell in wires[i])] if overused_cells else []
+    if offenders:
+        # negotiation gave up: the nets on overused cells are routed again one after another,
+        # each against the wires of every net that is not being rerouted or was rerouted before it
+        for i in offenders:
+            for cell in wires[i]:
+                occupancy[cell] -= 1
+            wires[i] = set()
+        legal = blocked.copy()
+        legal[occupancy > 0] = -1
+        for i in offenders:
+            reroute(i, legal)
+
+    if stats is not None:
+        stats["iterations"] = stats.get("iterations", 0) + iterations
+        stats["overused"] = stats.get("overused", 0) + overused_cells
+        stats["legalized"] = stats.get("legalized", 0) + len(offenders)
+        if any(unrouted):
+            stats["unrouted"] = stats.get("unrouted", 0) + sum(unrouted)
+    return results
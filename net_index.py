@@ -0,0 +1,115 @@
+import numpy as np
+
+
+# region queries over a routed design: summed-area tables answer "how many pins / used cells in
+# this box" in O(1) per box, the owner grid answers "which net uses this cell"
+def summed_area(counts):
+    """(rows + 1, cols + 1) int64 table whose [r, c] is the sum of counts[:r, :c]"""
+    counts = np.asarray(counts)
+    table = np.zeros((counts.shape[0] + 1, counts.shape[1] + 1), dtype=np.int64)
+    np.cumsum(counts, axis=0, dtype=np.int64, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+def box_sums(table, windows):
+    """Sum inside each (r0, r1, c0, c1) window of a summed_area table, ends exclusive, empty windows sum to 0"""
+    windows = np.asarray(windows, dtype=np.int64).reshape(-1, 4)
+    r0, r1, c0, c1 = windows.T
+    r1 = np.maximum(r0, r1)
+    c1 = np.maximum(c0, c1)
+    return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
+
+def bounding_boxes(nets):
+    """(len(nets), 4) array of every net's pin bounding box as (r0, r1, c0, c1), ends exclusive"""
+    boxes = np.zeros((len(nets), 4), dtype=np.int64)
+    for i, net in enumerate(nets):
+        pins = np.asarray(net, dtype=np.int64).reshape(-1, 3)
+        boxes[i] = pins[:, 1].min(), pins[:, 1].max() + 1, pins[:, 2].min(), pins[:, 2].max() + 1
+    return boxes
+
+def pin_table(nets, rows, cols):
+    """summed_area table of the number of pins, on any layer, per (row, col)"""
+    counts = np.zeros((rows, cols), dtype=np.int64)
+    if len(nets):
+        pins = np.concatenate([np.asarray(net, dtype=np.int64).reshape(-1, 3) for net in nets])
+        np.add.at(counts, (pins[:, 1], pins[:, 2]), 1)
+    return summed_area(counts)
+
+def interior_pin_counts(nets, rows, cols):
+    """Pins of all nets strictly inside each net's bounding box"""
+    boxes = bounding_boxes(nets)
+    # strictly inside drops the box's border rows and columns
+    boxes += np.array([1, -1, 1, -1])
+    return box_sums(pin_table(nets, rows, cols), boxes)
+
+def congestion(blocked, windows):
+    """Fraction of blocked (rows, cols) cells inside each window, 0 for empty windows"""
+    windows = np.asarray(windows, dtype=np.int64).reshape(-1, 4)
+    used = box_sums(summed_area(blocked), windows)
+    area = np.maximum(windows[:, 1] - windows[:, 0], 0) * np.maximum(windows[:, 3] - windows[:, 2], 0)
+    return np.divide(used, area, out=np.zeros(len(windows)), where=area > 0)
+
+def order_nets(nets, rows, cols):
+    """Net indices by increasing number of pins inside their bounding box, ties keep their order"""
+    return np.argsort(interior_pin_counts(nets, rows, cols), kind="stable").tolist()
+
+class NetIndex:
+    """Id of the net using every cell of a (layers, rows, cols) grid, 0 where no net is committed
+
+    Nets are committed with the cells of their wires and pins and can be released again.
+    Region queries go through a summed-area table of the used cells that is rebuilt only
+    after a change.
+    """
+
+    def __init__(self, shape):
+        self.owner = np.zeros(shape, dtype=np.int32)
+        # flat indices of the cells each net committed
+        self._cells = {}
+        self._usage = None
+
+    @classmethod
+    def from_routes(cls, shape, nets, results):
+        """Index of algorithm.route_nets results, net i gets id i + 1, unrouted (None) nets are left out"""
+        index = cls(shape)
+        for i, (net, result) in enumerate(zip(nets, results)):
+            if result is not None:
+                index.commit(i + 1, list(result[0]) + [tuple(pin) for pin in net])
+        return index
+
+    def commit(self, net_id, cells):
+        """Record net_id as the user of (layer, row, col) cells"""
+        flat = np.ravel_multi_index(np.array(cells, dtype=np.int64).reshape(-1, 3).T, self.owner.shape)
+        self.owner.flat[flat] = net_id
+        self._cells[net_id] = np.concatenate([self._cells[net_id], flat]) if net_id in self._cells else flat
+        self._usage = None
+
+    def release(self, net_id):
+        """Forget net_id, returns the flat indices of the cells it used (None if it had none)"""
+        flat = self._cells.pop(net_id, None)
+        if flat is not None:
+            self.owner.flat[flat] = 0
+            self._usage = None
+        return flat
+
+    def cells(self, net_id):
+        """(layer, row, col) arrays of the cells net_id uses"""
+        flat = self._cells.get(net_id, np.empty(0, dtype=np.int64))
+        return np.unravel_index(flat, self.owner.shape)
+
+    def nets_in(self, window):
+        """Sorted ids of the nets using any cell of window, (r0, r1, c0, c1) like algorithm.search_windows"""
+        r0, r1, c0, c1 = window
+        ids = np.unique(self.owner[:, r0:r1, c0:c1])
+        return ids[ids > 0].tolist()
+
+    def overlaps(self, cells, net_id=0):
+        """Sorted ids of the nets other than net_id using any of the (layer, row, col) cells"""
+        layers, rows, cols = np.array(cells, dtype=np.int64).reshape(-1, 3).T
+        ids = np.unique(self.owner[layers, rows, cols])
+        return ids[(ids > 0) & (ids != net_id)].tolist()
+
+    def usage(self, windows):
+        """Committed cells, on any layer, inside each (r0, r1, c0, c1) window"""
+        if self._usage is None:
+            self._usage = summed_area(np.count_nonzero(self.owner, axis=0))
+        return box_sums(self._usage, windows)
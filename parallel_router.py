@@ -0,0 +1,120 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from algorithm import commit_route, lee_router_multi, route_net, search_windows, validate_pins
+
+# the committed obstacle grid as seen by a worker process, attached once per process
+_shared_grid = None
+
+
+def _attach(name, shape, dtype):
+    global _shared_grid
+    memory = shared_memory.SharedMemory(name=name)
+    _shared_grid = (memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+
+def _route_in_window(job):
+    # route a net without leaving its first search window, None if that is not enough
+    index, net, direction_cost, via_cost, options = job
+    grid = _shared_grid[1]
+    stats = {}
+    try:
+        validate_pins(grid, net)
+    except ValueError:
+        return index, None, stats
+
+    all_paths, all_vias = lee_router_multi(grid, net, direction_cost, via_cost, max_windows=1, stats=stats,
+                                           **options)
+    if stats.pop("unrouted", 0):
+        return index, None, stats
+    return index, (all_paths, all_vias), stats
+
+def _overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+def schedule_waves(windows):
+    """Split net indices into waves of nets whose windows do not overlap
+
+    A net goes one wave after the latest earlier net whose window overlaps its own, so the
+    nets of a wave are independent of each other and every earlier overlapping net is routed
+    in a previous wave.
+    """
+    waves = []
+    wave_of = []
+    for j, window in enumerate(windows):
+        wave = 0
+        for i in range(j):
+            if wave_of[i] >= wave and _overlaps(windows[i], window):
+                wave = wave_of[i] + 1
+        wave_of.append(wave)
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(j)
+    return waves
+
+def route_nets_parallel(grid, nets, direction_cost=10, via_cost=50, window_margin=10, processes=None, stats=None,
+                        progress=None, **options):
+    """Route nets in a process pool with the same result as algorithm.route_nets(..., window_margin=window_margin)
+
+    Each wave of nets with disjoint windows (pin bounding box plus window_margin) is routed in
+    parallel, every worker reading the committed grid from shared memory and staying inside
+    its net's window. Results are committed in net order. A result is kept only if the
+    committed grid inside its window is unchanged since it was computed, otherwise the net is
+    rerouted serially at its turn, so the output always matches serial routing. progress is
+    called like in route_nets after every committed net, if it returns False no further wave
+    is started and only the results committed so far are returned. stats, if given, collects
+    the counters of lee_router_multi for the routes that are returned.
+    """
+    logical_grid_3d = np.array(grid, np.float32)
+    layers, rows, cols = logical_grid_3d.shape
+    options = dict(options, window_margin=window_margin)
+    windows = [next(search_windows(net, rows, cols, window_margin)) for net in nets]
+    results = [None] * len(nets)
+
+    memory = shared_memory.SharedMemory(create=True, size=logical_grid_3d.nbytes)
+    try:
+        shared = np.ndarray(logical_grid_3d.shape, dtype=logical_grid_3d.dtype, buffer=memory.buf)
+        shared[:] = logical_grid_3d
+        computed = {}
+        next_commit = 0
+        cancelled = False
+
+        with ProcessPoolExecutor(processes, initializer=_attach,
+                                 initargs=(memory.name, shared.shape, shared.dtype)) as pool:
+            for wave in schedule_waves(windows):
+                if cancelled:
+                    break
+                snapshots = {}
+                for i in wave:
+                    r0, r1, c0, c1 = windows[i]
+                    snapshots[i] = shared[:, r0:r1, c0:c1].copy()
+
+                jobs = [(i, nets[i], direction_cost, via_cost, options) for i in wave]
+                for i, result, worker_stats in pool.map(_route_in_window, jobs):
+                    computed[i] = (result, snapshots.pop(i), worker_stats)
+
+                # commit in net order as far as results are available
+                while next_commit in computed and not cancelled:
+                    result, snapshot, worker_stats = computed.pop(next_commit)
+                    r0, r1, c0, c1 = windows[next_commit]
+                    net = nets[next_commit]
+                    if result is not None and np.array_equal(shared[:, r0:r1, c0:c1], snapshot):
+                        commit_route(shared, net, result[0])
+                        results[next_commit] = result
+                        # a discarded result's work is not counted, its serial reroute is
+                        if stats is not None:
+                            for key, value in worker_stats.items():
+                                stats[key] = stats.get(key, 0) + value
+                    else:
+                        results[next_commit] = route_net(shared, net, direction_cost, via_cost, stats=stats,
+                                                         **options)
+                    next_commit += 1
+                    if progress is not None and progress(next_commit, len(nets)) is False:
+                        cancelled = True
+        del shared
+    finally:
+        memory.close()
+        memory.unlink()
+
+    return results[:next_commit]
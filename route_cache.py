@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from algorithm import route_nets
+from design_format import concat_rows, split_rows
+
+# bump whenever the router can return different routes for the same input, entries of an
+# older version are never matched and age out of the cache
+CACHE_VERSION = 1
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "maze_router")
+DEFAULT_MAX_BYTES = 1 << 30
+# a temporary file this old was left by a writer that died, live writes finish long before
+STALE_TMP_SECONDS = 3600
+
+
+def _feed(digest, value):
+    # hash a routing parameter by content, arrays by dtype, shape and bytes
+    if isinstance(value, np.ndarray):
+        digest.update(f"array{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"seq{len(value)}".encode())
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}".encode())
+        for key in sorted(value):
+            _feed(digest, key)
+            _feed(digest, value[key])
+    else:
+        digest.update(repr(value).encode())
+
+def cache_key(grid, nets, direction_cost, via_cost, **options):
+    """Hex digest of the obstacle grid, the ordered nets, the costs and the router options"""
+    digest = hashlib.sha256(f"maze_router v{CACHE_VERSION}".encode())
+    _feed(digest, np.asarray(grid) == -1)
+    _feed(digest, [np.asarray(net, dtype=np.int64) for net in nets])
+    _feed(digest, (direction_cost, via_cost))
+    _feed(digest, options)
+    return digest.hexdigest()
+
+class RouteCache:
+    """On-disk cache of route_nets results addressed by cache_key, evicting least recently used entries
+
+    Each entry is one .npz file in directory, its modification time is its last use. After a
+    put the oldest entries are removed until the cache fits in max_bytes, along with temporary
+    files that writers which died left behind.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """The results stored under key, or None on a miss or an entry of another version"""
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                if int(entry["version"]) != CACHE_VERSION:
+                    return None
+                routed = entry["routed"]
+                paths = split_rows(entry["cells"], entry["cell_offsets"])
+                vias = split_rows(entry["vias"], entry["via_offsets"])
+            # a concurrent evict() may remove the entry right after it was read
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        results = []
+        for i, is_routed in enumerate(routed):
+            if is_routed:
+                results.append(([tuple(cell) for cell in paths[i].tolist()],
+                                [tuple(via) for via in vias[i].tolist()]))
+            else:
+                results.append(None)
+        return results
+
+    def put(self, key, results):
+        """Store one (paths, vias) or None per net under key, then evict down to max_bytes"""
+        cells, cell_offsets = concat_rows([result[0] if result else [] for result in results], 3)
+        vias, via_offsets = concat_rows([result[1] if result else [] for result in results], 2)
+        routed = np.array([result is not None for result in results], dtype=bool)
+
+        # write under a temporary name so readers never see a partial entry, the suffix keeps
+        # evict() from counting it or deleting it before it is STALE_TMP_SECONDS old
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(file, version=CACHE_VERSION, routed=routed, cells=cells, cell_offsets=cell_offsets,
+                         vias=vias, via_offsets=via_offsets)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith((".npz", ".tmp")):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            if name.endswith(".npz"):
+                entries.append((info.st_mtime, info.st_size, name))
+            elif now - info.st_mtime > STALE_TMP_SECONDS:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def route_nets_cached(grid, nets, direction_cost=10, via_cost=50, cache=None, **options):
+    """algorithm.route_nets that returns a cached result for the same grid, nets, costs and options
+
+    cache defaults to a RouteCache in DEFAULT_DIRECTORY. A stats dict and a progress callback
+    are only used on a miss, and results cut short by progress are not stored.
+    """
+    if cache is None:
+        cache = RouteCache()
+    stats = options.pop("stats", None)
+    progress = options.pop("progress", None)
+    key = cache_key(grid, nets, direction_cost, via_cost, **options)
+
+    results = cache.get(key)
+    if results is None:
+        results = route_nets(grid, nets, direction_cost, via_cost, stats=stats, progress=progress, **options)
+        if len(results) == len(nets):
+            cache.put(key, results)
+    return results
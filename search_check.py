@@ -0,0 +1,115 @@
+import argparse
+import heapq
+import sys
+
+import numpy as np
+
+from algorithm import COST_SCALE, DIR_H, DIR_V, QUEUES, cell_to_node, free_cells, move_costs, search, straight_runs
+from sparse_grid import SparseGrid, sparse_search
+
+
+# script to run after touching algorithm.search(): every frontier, A*, straight runs, cell costs,
+# warm starts and the sparse backend must find the same costs as a plain Dijkstra written out separately
+def reference_cost(grid, sources, targets, costs, cell_cost=None):
+    """Cheapest cost from sources to any target over (layer, row, col, direction) states, None if unreachable"""
+    layers, rows, cols = grid.shape
+    h_move, v_move, bend, via = costs
+    dist = {}
+    pq = []
+    for l, r, c in sources:
+        for d in (DIR_H, DIR_V):
+            dist[(l, r, c, d)] = 0
+            pq.append((0, (l, r, c, d)))
+    heapq.heapify(pq)
+    while pq:
+        cost, (l, r, c, d) = heapq.heappop(pq)
+        if cost > dist[(l, r, c, d)]:
+            continue
+        if (l, r, c) in targets:
+            return cost
+        moves = [(l, r, c + dc, DIR_H, h_move[l] + (bend if d == DIR_V else 0)) for dc in (1, -1)]
+        moves += [(l, r + dr, c, DIR_V, v_move[l] + (bend if d == DIR_H else 0)) for dr in (1, -1)]
+        moves += [(nl, r, c, nd, via) for nl in (l + 1, l - 1) for nd in (DIR_H, DIR_V)]
+        for nl, nr, nc, nd, step in moves:
+            if not (0 <= nl < layers and 0 <= nr < rows and 0 <= nc < cols) or grid[nl, nr, nc] == -1:
+                continue
+            step += cost + (cell_cost[nl, nr, nc] if cell_cost is not None else 0)
+            if step < dist.get((nl, nr, nc, nd), step + 1):
+                dist[(nl, nr, nc, nd)] = step
+                heapq.heappush(pq, (step, (nl, nr, nc, nd)))
+    return None
+
+def random_case(rng):
+    """A small seeded grid, its move costs, scaled cell costs and a few source and target cells"""
+    rows, cols = rng.integers(2, 16, size=2)
+    grid = np.where(rng.random((2, rows, cols)) < rng.uniform(0, 0.4), -1, 0).astype(np.int8)
+    free = [tuple(cell) for cell in np.argwhere(grid != -1).tolist()]
+    if len(free) < 2:
+        return None
+    costs = move_costs(['H', 'V'], int(rng.integers(1, 15)), int(rng.integers(0, 60)))
+    cell_cost = rng.integers(0, 3 * COST_SCALE, size=grid.shape)
+    picks = rng.permutation(len(free))
+    n_sources = int(rng.integers(1, min(4, len(free))))
+    sources = [free[i] for i in picks[:n_sources]]
+    targets = [free[i] for i in picks[n_sources:n_sources + int(rng.integers(1, 4))]]
+    return grid, costs, cell_cost, sources, targets
+
+def check_case(grid, costs, cell_cost, sources, targets):
+    """(mode, expected, found) for every mode whose cost differs from the reference"""
+    layers, rows, cols = grid.shape
+    free = free_cells(grid)
+    nodes = lambda cells: [cell_to_node(cell, rows, cols) for cell in cells]
+    flat_costs = cell_cost.astype(np.int64).ravel().tolist()
+    runs = straight_runs(free, grid.shape, ['H', 'V'])
+
+    def cost_of(found):
+        return None if found is None else found[1]
+
+    expected = reference_cost(grid, set(sources), set(targets), costs)
+    expected_cell = reference_cost(grid, set(sources), set(targets), costs, cell_cost)
+    found = []
+    for queue in QUEUES:
+        for astar in (False, True):
+            for jump in (None, runs):
+                label = f"{'jump ' if jump else ''}{queue}{'+A*' if astar else ''}"
+                found.append((label, expected, cost_of(search(free, grid.shape, nodes(sources), set(nodes(targets)),
+                                                              costs, queue, astar, runs=jump))))
+                found.append((f"{label} cell_cost", expected_cell,
+                              cost_of(search(free, grid.shape, nodes(sources), set(nodes(targets)), costs, queue,
+                                             astar, cell_cost=flat_costs, runs=jump))))
+
+                # warm: the sources arrive one at a time and the targets shrink, like a growing routing tree
+                warm = {}
+                for i in range(1, len(sources) + 1):
+                    step_targets = targets[:max(1, len(targets) - i + 1)]
+                    warm_cost = cost_of(search(free, grid.shape, nodes(sources[i - 1:i]), set(nodes(step_targets)),
+                                               costs, queue, astar, warm=warm, runs=jump))
+                    found.append((f"warm {label}", reference_cost(grid, set(sources[:i]), set(step_targets), costs),
+                                  warm_cost))
+
+    sparse = SparseGrid.from_dense(grid)
+    for astar in (False, True):
+        result = sparse_search(sparse, sources, targets, costs, astar)
+        found.append((f"sparse{'+A*' if astar else ''}", expected, None if result is None else result[0]))
+    return [(mode, want, got) for mode, want, got in found if want != got]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every search mode against a plain reference Dijkstra")
+    parser.add_argument("--grids", type=int, default=300, help="random grids to check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    checked = 0
+    failures = []
+    while checked < args.grids:
+        case = random_case(rng)
+        if case is None:
+            continue
+        checked += 1
+        failures.extend((checked, *mismatch) for mismatch in check_case(*case))
+
+    for grid_number, mode, want, got in failures[:20]:
+        print(f"grid {grid_number}: {mode} found cost {got}, expected {want}")
+    print(f"{checked} grids, {len(failures)} mismatches")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,361 @@
+import heapq
+from array import array
+
+import numpy as np
+
+from algorithm import DIR_H, DIR_V, cell_lower_bound, cell_to_node, get_source_pin, move_costs, node_to_cell
+from file_handling import CHUNK_SIZE, read_blocks, read_header
+
+# masks and search state are allocated per TILE x TILE block of cells, and only for the blocks
+# a search reaches, so memory follows the routed area instead of the board
+TILE_BITS = 6
+TILE = 1 << TILE_BITS
+TILE_MASK = TILE - 1
+
+# heap entries are plain ints holding (cost << STATE_BITS) | state like in algorithm.search
+STATE_BITS = 48
+STATE_MASK = (1 << STATE_BITS) - 1
+INF = 2 ** 62
+
+
+class SparseGrid:
+    """A (layers, rows, cols) routing grid that never allocates the full board
+
+    Obstacles block a (row, col) on every layer like OBS lines and are kept as sorted,
+    merged runs per row: the runs of row r are starts[row_ptr[r]:row_ptr[r + 1]] up to the
+    matching ends, ends exclusive. Wires and pins committed by routed nets block their own
+    layer only and are kept per tile. The 0/1 byte mask of a tile's free cells is built from
+    both the first time a search reaches it.
+    """
+
+    def __init__(self, shape, row_ptr, starts, ends):
+        self.shape = tuple(int(v) for v in shape)
+        layers, rows, cols = self.shape
+        self.row_ptr = row_ptr
+        self.starts = starts
+        self.ends = ends
+        self.tile_rows = -(-rows // TILE)
+        self.tile_cols = -(-cols // TILE)
+        # tile id -> set of local indices of committed cells, and -> bytearray free mask
+        self._used = {}
+        self._masks = {}
+
+    @classmethod
+    def from_obstacles(cls, shape, rows, cols):
+        """Grid of the given shape with (rows[i], cols[i]) blocked on every layer, duplicates allowed"""
+        n_rows, n_cols = shape[1], shape[2]
+        flat = np.unique(np.asarray(rows, dtype=np.int64) * n_cols + np.asarray(cols, dtype=np.int64))
+        # a run starts at every cell that does not directly follow the previous one in its row
+        first = np.ones(len(flat), dtype=bool)
+        first[1:] = (np.diff(flat) != 1) | (flat[1:] % n_cols == 0)
+        last = np.ones(len(flat), dtype=bool)
+        last[:-1] = first[1:]
+        run_rows = flat[first] // n_cols
+        starts = (flat[first] - run_rows * n_cols).astype(np.int32)
+        ends = (flat[last] + 1 - run_rows * n_cols).astype(np.int32)
+        row_ptr = np.searchsorted(run_rows, np.arange(n_rows + 1))
+        return cls(shape, row_ptr, starts, ends)
+
+    @classmethod
+    def from_dense(cls, grid):
+        """Grid of a dense (layers, rows, cols) array with -1 on blocked cells
+
+        Cells blocked on every layer become obstacle runs, cells blocked on some layers only
+        are committed like wires.
+        """
+        blocked = np.asarray(grid) == -1
+        rows, cols = np.nonzero(blocked.all(axis=0))
+        sparse = cls.from_obstacles(blocked.shape, rows, cols)
+        sparse.commit(np.argwhere(blocked & ~blocked.all(axis=0)).tolist())
+        return sparse
+
+    def copy(self):
+        """Grid sharing the obstacle runs, with its own committed cells"""
+        grid = SparseGrid(self.shape, self.row_ptr, self.starts, self.ends)
+        grid._used = {tile: set(cells) for tile, cells in self._used.items()}
+        return grid
+
+    def tile_of(self, l, r, c):
+        """(tile id, local index) of a cell"""
+        return ((l * self.tile_rows + (r >> TILE_BITS)) * self.tile_cols + (c >> TILE_BITS),
+                ((r & TILE_MASK) << TILE_BITS) | (c & TILE_MASK))
+
+    def mask(self, tile):
+        """bytearray of TILE * TILE flags, 1 on the free cells of a tile and 0 past the grid's edge"""
+        found = self._masks.get(tile)
+        if found is not None:
+            return found
+        layers, rows, cols = self.shape
+        rem, tc = divmod(tile, self.tile_cols)
+        tr = rem % self.tile_rows
+        r0, c0 = tr << TILE_BITS, tc << TILE_BITS
+        free = np.zeros((TILE, TILE), dtype=np.uint8)
+        free[:min(TILE, rows - r0), :min(TILE, cols - c0)] = 1
+        for r in range(r0, min(r0 + TILE, rows)):
+            a, b = self.row_ptr[r], self.row_ptr[r + 1]
+            if a == b:
+                continue
+            # the runs overlapping the tile's columns
+            lo = a + np.searchsorted(self.ends[a:b], c0, side="right")
+            hi = a + np.searchsorted(self.starts[a:b], c0 + TILE)
+            for start, end in zip(self.starts[lo:hi].tolist(), self.ends[lo:hi].tolist()):
+                free[r - r0, max(start - c0, 0):min(end - c0, TILE)] = 0
+        free = bytearray(free.tobytes())
+        for local in self._used.get(tile, ()):
+            free[local] = 0
+        self._masks[tile] = free
+        return free
+
+    def is_free(self, cell):
+        """Whether a (layer, row, col) cell is inside the grid and not blocked"""
+        l, r, c = cell
+        layers, rows, cols = self.shape
+        if not (0 <= l < layers and 0 <= r < rows and 0 <= c < cols):
+            return False
+        tile, local = self.tile_of(l, r, c)
+        return bool(self.mask(tile)[local])
+
+    def commit(self, cells):
+        """Block (layer, row, col) cells on their own layer, e.g. a routed net's wires and pins"""
+        for l, r, c in cells:
+            tile, local = self.tile_of(l, r, c)
+            self._used.setdefault(tile, set()).add(local)
+            if tile in self._masks:
+                self._masks[tile][local] = 0
+
+    def obstacle_count(self):
+        """Number of (row, col) obstacles, each blocking every layer"""
+        return int(np.sum(self.ends.astype(np.int64) - self.starts))
+
+    def window(self, r0, r1, c0, c1):
+        """Dense int8 (layers, r1 - r0, c1 - c0) crop with -1 on blocked cells, like file_handling.input_file"""
+        layers = self.shape[0]
+        crop = np.zeros((layers, r1 - r0, c1 - c0), dtype=np.int8)
+        for l in range(layers):
+            for tr in range(r0 >> TILE_BITS, ((r1 - 1) >> TILE_BITS) + 1):
+                for tc in range(c0 >> TILE_BITS, ((c1 - 1) >> TILE_BITS) + 1):
+                    free = np.frombuffer(self.mask((l * self.tile_rows + tr) * self.tile_cols + tc), dtype=np.uint8)
+                    tr0, tc0 = tr << TILE_BITS, tc << TILE_BITS
+                    a0, a1 = max(r0, tr0), min(r1, tr0 + TILE)
+                    b0, b1 = max(c0, tc0), min(c1, tc0 + TILE)
+                    part = free.reshape(TILE, TILE)[a0 - tr0:a1 - tr0, b0 - tc0:b1 - tc0]
+                    crop[l, a0 - r0:a1 - r0, b0 - c0:b1 - c0] = np.where(part, 0, -1)
+        return crop
+
+
+def read_sparse(filename, chunk_size=CHUNK_SIZE):
+    """Read a testcase file like file_handling.input_file into a SparseGrid, returns (grid, nets)
+
+    Only the obstacle coordinates and their runs are held in memory, never a dense grid.
+    """
+    nets = []
+    rows_found = []
+    cols_found = []
+
+    with open(filename, "rb") as file:
+        rows, cols = read_header(file, filename)
+        for block_nets, x, y in read_blocks(file, filename, rows, cols, chunk_size):
+            nets.extend(block_nets)
+            rows_found.append(y)
+            cols_found.append(x)
+
+    grid = SparseGrid.from_obstacles((2, rows, cols), np.concatenate(rows_found), np.concatenate(cols_found))
+    return grid, nets
+
+
+def sparse_search(grid, sources, targets, costs, astar=True, stats=None):
+    """algorithm.search() on a SparseGrid between (layer, row, col) cells
+
+    States are still (cell, incoming direction) pairs, but distances and predecessors are
+    kept in per-tile arrays that are allocated the first time the search relaxes a state
+    of the tile. astar orders the heap by cost plus algorithm.cell_lower_bound() to the
+    targets, which keeps a search on a huge board to the tiles between sources and targets.
+    stats, if given, counts "expanded", "popped", "stale", "pushed" and "relaxed" like
+    search() and the search "tiles" allocated. Returns (cost, path, vias) for the cheapest
+    target, or None if no target is reachable.
+    """
+    layers, rows, cols = grid.shape
+    plane = rows * cols
+    tile_rows, tile_cols = grid.tile_rows, grid.tile_cols
+    masks = grid._masks
+    h_move, v_move, bend, via = costs
+    sources = [tuple(int(v) for v in cell) for cell in sources]
+    targets = [tuple(int(v) for v in cell) for cell in targets]
+    estimate = cell_lower_bound(costs, targets)[0] if astar else None
+    target_nodes = {cell_to_node(cell, rows, cols) for cell in targets}
+
+    # tile id -> distances, predecessor nodes and predecessor directions of its 2 * TILE * TILE states
+    dist_tiles = {}
+    pred_tiles = {}
+    dir_tiles = {}
+    pq = []
+    expanded = popped = relaxed = 0
+
+    def tile_state(tile):
+        dist = dist_tiles.get(tile)
+        if dist is None:
+            dist = dist_tiles[tile] = array('q', [INF]) * (2 * TILE * TILE)
+            pred_tiles[tile] = array('q', [-1]) * (2 * TILE * TILE)
+            dir_tiles[tile] = bytearray(2 * TILE * TILE)
+        return dist
+
+    for l, r, c in sources:
+        tile, local = grid.tile_of(l, r, c)
+        dist = tile_state(tile)
+        node = cell_to_node((l, r, c), rows, cols)
+        for d in (DIR_H, DIR_V):
+            dist[2 * local + d] = 0
+            key = estimate(l, r, c, d) if estimate else 0
+            pq.append((key << STATE_BITS) | (2 * node + d))
+    pushed = len(pq)
+    heapq.heapify(pq)
+
+    found = None
+    while pq:
+        item = heapq.heappop(pq)
+        popped += 1
+        key = item >> STATE_BITS
+        state = item & STATE_MASK
+        node, d = divmod(state, 2)
+        l, rem = divmod(node, plane)
+        r, c = divmod(rem, cols)
+        tile = (l * tile_rows + (r >> TILE_BITS)) * tile_cols + (c >> TILE_BITS)
+        cost = dist_tiles[tile][2 * (((r & TILE_MASK) << TILE_BITS) | (c & TILE_MASK)) + d]
+        if key > (cost + estimate(l, r, c, d) if estimate else cost):
+            continue
+
+        expanded += 1
+        if node in target_nodes:
+            found = state, cost
+            break
+
+        h_step = cost + h_move[l] + (bend if d == DIR_V else 0)
+        v_step = cost + v_move[l] + (bend if d == DIR_H else 0)
+        # (layer, row, col, node, direction, cost) of every neighbour state
+        neighbours = []
+        if c + 1 < cols:
+            neighbours.append((l, r, c + 1, node + 1, DIR_H, h_step))
+        if c > 0:
+            neighbours.append((l, r, c - 1, node - 1, DIR_H, h_step))
+        if r + 1 < rows:
+            neighbours.append((l, r + 1, c, node + cols, DIR_V, v_step))
+        if r > 0:
+            neighbours.append((l, r - 1, c, node - cols, DIR_V, v_step))
+        # landing on another layer leaves the next move free of a bend
+        for nl in (l + 1, l - 1):
+            if 0 <= nl < layers:
+                nb = node + (nl - l) * plane
+                neighbours.append((nl, r, c, nb, DIR_H, cost + via))
+                neighbours.append((nl, r, c, nb, DIR_V, cost + via))
+
+        for nl, nr, nc, nb, nd, step in neighbours:
+            tile = (nl * tile_rows + (nr >> TILE_BITS)) * tile_cols + (nc >> TILE_BITS)
+            local = ((nr & TILE_MASK) << TILE_BITS) | (nc & TILE_MASK)
+            free = masks.get(tile)
+            if free is None:
+                free = grid.mask(tile)
+            if not free[local]:
+                continue
+            dist = dist_tiles.get(tile)
+            if dist is None:
+                dist = tile_state(tile)
+            ns = 2 * local + nd
+            if step < dist[ns]:
+                dist[ns] = step
+                pred_tiles[tile][ns] = node
+                dir_tiles[tile][ns] = d
+                key = step + estimate(nl, nr, nc, nd) if estimate else step
+                relaxed += 1
+                heapq.heappush(pq, (key << STATE_BITS) | (2 * nb + nd))
+
+    if stats is not None:
+        for name, value in (("expanded", expanded), ("popped", popped), ("stale", popped - expanded),
+                            ("pushed", pushed + relaxed), ("relaxed", relaxed), ("tiles", len(dist_tiles))):
+            stats[name] = stats.get(name, 0) + value
+    if found is None:
+        return None
+
+    # walk the predecessors back to a source
+    state, cost = found
+    path = [node_to_cell(state // 2, rows, cols)]
+    vias = []
+    while True:
+        l, r, c = path[-1]
+        tile, local = grid.tile_of(l, r, c)
+        s = 2 * local + state % 2
+        prev = pred_tiles[tile][s]
+        if prev < 0:
+            break
+        state = 2 * prev + dir_tiles[tile][s]
+        cell = node_to_cell(prev, rows, cols)
+        if cell[0] != l:
+            vias.append(cell[1:])
+        path.append(cell)
+    path.reverse()
+    vias.reverse()
+    return cost, path, vias
+
+
+def sparse_router_multi(grid, pins, direction_cost=10, via_cost=50, astar=True, stats=None):
+    """algorithm.lee_router_multi() with multi_target on a SparseGrid, returns (paths, vias)
+
+    The routing tree grows from the source pin by one sparse_search() per pin towards the
+    nearest unrouted pin. If some pins cannot be connected the wires found so far are
+    returned and stats, if given, counts the pins left "unrouted" and the "searches" run.
+    """
+    layers, rows, cols = grid.shape
+    pins = [tuple(int(v) for v in pin) for pin in pins]
+    if len(pins) <= 1:
+        return [], []
+    # layer 0 is horizontal, layer 1 vertical
+    costs = move_costs(['H', 'V'][:layers], direction_cost, via_cost)
+
+    source_pin = get_source_pin(pins, rows, cols)
+    routing_tree = {source_pin}
+    all_paths = []
+    all_vias = []
+    unrouted_pins = set(pins) - {source_pin}
+
+    while unrouted_pins:
+        if stats is not None:
+            stats["searches"] = stats.get("searches", 0) + 1
+        found = sparse_search(grid, routing_tree, unrouted_pins, costs, astar, stats)
+        if found is None:
+            if stats is not None:
+                stats["unrouted"] = stats.get("unrouted", 0) + len(unrouted_pins)
+            break
+        _, path, vias = found
+        all_paths.extend([cell for cell in path if cell not in routing_tree])
+        all_vias.extend(vias)
+        routing_tree.update(path)
+        unrouted_pins.remove(path[-1])
+
+    return all_paths, all_vias
+
+
+def route_net_sparse(grid, net, direction_cost=10, via_cost=50, **options):
+    """algorithm.route_net() on a SparseGrid: route one net and commit it
+
+    Returns (paths, vias), or None if a pin is off the grid or blocked. options are passed
+    on to sparse_router_multi.
+    """
+    pins = [tuple(int(v) for v in pin) for pin in net]
+    if not all(grid.is_free(pin) for pin in pins):
+        return None
+    all_paths, all_vias = sparse_router_multi(grid, pins, direction_cost, via_cost, **options)
+    grid.commit(all_paths + pins)
+    return all_paths, all_vias
+
+
+def route_nets_sparse(grid, nets, direction_cost=10, via_cost=50, progress=None, **options):
+    """algorithm.route_nets() on a SparseGrid, which is left unchanged
+
+    Returns one (paths, vias) or None per net, progress works like in route_nets.
+    """
+    grid = grid.copy()
+    results = []
+    for i, net in enumerate(nets):
+        results.append(route_net_sparse(grid, net, direction_cost, via_cost, **options))
+        if progress is not None and progress(i + 1, len(nets)) is False:
+            break
+    return results
@@ -1,30 +1,188 @@
-import random
+import argparse
+from random import Random
+
+import numpy as np
+
+from design_format import save_design
+
+# structured obstacle patterns of generate_design
+SCENARIOS = ("random", "channels", "macros", "maze", "hotspot")
+# rows of random numbers drawn at once, which bounds the generator's scratch memory
+ROW_BLOCK = 1024
+
 
 # script to generate pseudo-random test cases for the router
-def generate_testcase(filename, size=200, num_obs=8000, num_nets=10, pins_per_net=3):
+def generate_testcase(filename, size=200, num_obs=8000, num_nets=10, pins_per_net=3, seed=None):
+    # the same seed always writes the same testcase
+    rng = Random(seed)
     with open(filename, "w") as f:
         f.write(f"{size}x{size}\n")
-        
+
         # Generate obstacles
         obs_set = set()
         while len(obs_set) < num_obs:
-            y = random.randint(0, size-1)
-            x = random.randint(0, size-1)
+            y = rng.randint(0, size-1)
+            x = rng.randint(0, size-1)
             obs_set.add((y, x))
         for y, x in obs_set:
             f.write(f"OBS ({y},{x})\n")
-        
+
         # Generate nets
         for net_id in range(1, num_nets+1):
             pins = set()
             while len(pins) < pins_per_net:
-                layer = random.randint(0, 1)
-                y = random.randint(0, size-1)
-                x = random.randint(0, size-1)
+                layer = rng.randint(0, 1)
+                y = rng.randint(0, size-1)
+                x = rng.randint(0, size-1)
                 if (y, x) not in obs_set:
                     pins.add((layer, y, x))
             pins_str = ", ".join(f"({l},{y},{x})" for l, y, x in pins)
             f.write(f"net{net_id} {pins_str}\n")
 
+def random_blocked(rng, rows, cols, density):
+    # each cell blocked with probability density, drawn a block of rows at a time
+    blocked = np.zeros((rows, cols), dtype=bool)
+    for r0 in range(0, rows, ROW_BLOCK):
+        r1 = min(r0 + ROW_BLOCK, rows)
+        blocked[r0:r1] = rng.random((r1 - r0, cols), dtype=np.float32) < density
+    return blocked
+
+def channels_blocked(rng, rows, cols, density, pitch=8, gap=2):
+    # horizontal walls every pitch rows, each with a gap of free cells every few pitches,
+    # and random obstacles at density in the channels between them
+    blocked = random_blocked(rng, rows, cols, density)
+    blocked[::pitch] = True
+    doors = rng.integers(0, cols - gap + 1, size=(len(range(0, rows, pitch)), max(cols // (4 * pitch), 1)))
+    wall_rows = np.arange(0, rows, pitch)[:, None, None]
+    door_cols = doors[:, :, None] + np.arange(gap)
+    blocked[np.broadcast_to(wall_rows, door_cols.shape), door_cols] = False
+    return blocked
+
+def macros_blocked(rng, rows, cols, density, min_side=4, max_side=32):
+    # solid rectangular blocks covering about density of the grid
+    blocked = np.zeros((rows, cols), dtype=bool)
+    max_side = max(min(max_side, rows // 4, cols // 4), min_side)
+    mean_area = ((min_side + max_side) / 2) ** 2
+    count = int(density * rows * cols / mean_area)
+    heights = rng.integers(min_side, max_side + 1, size=count)
+    widths = rng.integers(min_side, max_side + 1, size=count)
+    tops = rng.integers(0, rows, size=count)
+    lefts = rng.integers(0, cols, size=count)
+    for top, left, height, width in zip(tops, lefts, heights, widths):
+        blocked[top:top + height, left:left + width] = True
+    return blocked
+
+def maze_blocked(rng, rows, cols):
+    # binary tree maze: walls on every even row and column, every room opens north or west,
+    # which connects all rooms into one tree without any loop
+    blocked = np.zeros((rows, cols), dtype=bool)
+    blocked[::2] = True
+    blocked[:, ::2] = True
+    room_rows = np.arange(1, rows, 2)
+    room_cols = np.arange(1, cols, 2)
+    blocked[np.ix_(room_rows, room_cols)] = False
+    rr, cc = np.meshgrid(room_rows, room_cols, indexing="ij")
+    north = rng.random(rr.shape) < 0.5
+    # rooms on the first row can only open west, on the first column only north
+    north[:, 0] = True
+    north[0, :] = False
+    opens_west = ~north & (cc > 1)
+    blocked[rr[north] - 1, cc[north]] = False
+    blocked[rr[opens_west], cc[opens_west] - 1] = False
+    return blocked
+
+def sample_pins(rng, blocked, num_nets, pins_per_net, centers=None, spread=None):
+    """Distinct free pins for num_nets nets, near random centers if given, as (layer, row, col) arrays"""
+    rows, cols = blocked.shape
+    needed = num_nets * pins_per_net
+    free_count = int(np.count_nonzero(~blocked))
+    if free_count < needed:
+        raise ValueError(f"Only {free_count} free cells for {needed} pins")
+
+    chosen = np.empty(0, dtype=np.int64)
+    while len(chosen) < needed:
+        draw = 2 * (needed - len(chosen)) + 16
+        if centers is None:
+            cells = rng.integers(0, rows * cols, size=draw)
+        else:
+            center = centers[rng.integers(0, len(centers), size=draw)]
+            offsets = rng.normal(0, spread, size=(draw, 2)).round().astype(np.int64)
+            r = np.clip(center[:, 0] + offsets[:, 0], 0, rows - 1)
+            c = np.clip(center[:, 1] + offsets[:, 1], 0, cols - 1)
+            cells = r * cols + c
+        cells = cells[~blocked.ravel()[cells]]
+        # keep the first draw of every cell, in draw order
+        candidates = np.concatenate([chosen, cells])
+        _, first = np.unique(candidates, return_index=True)
+        chosen = candidates[np.sort(first)][:needed]
+
+    layers = rng.integers(0, 2, size=needed)
+    pins = np.stack([layers, chosen // cols, chosen % cols], axis=1)
+    return [pins[i * pins_per_net:(i + 1) * pins_per_net] for i in range(num_nets)]
+
+def generate_design(size=1000, density=0.1, num_nets=10, pins_per_net=3, scenario="random", seed=None):
+    """Seeded, vectorized testcase of one of SCENARIOS, returns (grid, nets) like file_handling.input_file
+
+    "random" blocks each cell with probability density, "channels" adds walls with narrow
+    gaps every few rows, "macros" places solid blocks covering about density of the grid,
+    "maze" is a perfect maze with one-cell corridors and "hotspot" crowds the pins of all
+    nets around a few centers over random obstacles.
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}, expected one of {SCENARIOS}")
+    rng = np.random.default_rng(seed)
+
+    if scenario == "channels":
+        blocked = channels_blocked(rng, size, size, density)
+    elif scenario == "macros":
+        blocked = macros_blocked(rng, size, size, density)
+    elif scenario == "maze":
+        blocked = maze_blocked(rng, size, size)
+    else:
+        blocked = random_blocked(rng, size, size, density)
+
+    centers = spread = None
+    if scenario == "hotspot":
+        centers = rng.integers(0, size, size=(max(num_nets // 8, 1), 2))
+        spread = max(size / 32, 2)
+    nets = sample_pins(rng, blocked, num_nets, pins_per_net, centers, spread)
+
+    grid = np.zeros((2, size, size), dtype=np.int8)
+    grid[:, blocked] = -1
+    return grid, nets
+
+def write_text(filename, grid, nets):
+    """Write grid and nets in the text testcase format, obstacles in bulk"""
+    layers, rows, cols = np.shape(grid)
+    blocked = np.asarray(grid)[0] == -1
+    with open(filename, "w") as f:
+        f.write(f"{rows}x{cols}\n")
+        # the text format lists obstacles as (x, y) and pins as (layer, x, y), each block of
+        # rows is formatted by one % and written by one call
+        for r0 in range(0, rows, ROW_BLOCK):
+            obstacle_rows, obstacle_cols = np.nonzero(blocked[r0:r0 + ROW_BLOCK])
+            if len(obstacle_rows):
+                coordinates = np.stack([obstacle_cols, obstacle_rows + r0], axis=1).ravel().tolist()
+                f.write("OBS (%d,%d)\n" * len(obstacle_rows) % tuple(coordinates))
+        for net_id, net in enumerate(nets, start=1):
+            pins_str = ", ".join(f"({l},{c},{r})" for l, r, c in np.asarray(net).tolist())
+            f.write(f"net{net_id} {pins_str}\n")
+
 if __name__ == "__main__":
-    generate_testcase("Testcases/case.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate a seeded testcase")
+    parser.add_argument("output", nargs="?", default="Testcases/case.txt",
+                        help="text testcase file, or design directory with --format design")
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--nets", type=int, default=10)
+    parser.add_argument("--pins", type=int, default=3)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="random")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--format", choices=("text", "design"), default="text")
+    args = parser.parse_args()
+
+    grid, nets = generate_design(args.size, args.density, args.nets, args.pins, args.scenario, args.seed)
+    if args.format == "design":
+        save_design(args.output, grid, nets)
+    else:
+        write_text(args.output, grid, nets)
@@ -0,0 +1,55 @@
+import numpy as np
+
+# connection orders accepted by algorithm.lee_router_multi(topology=...)
+TOPOLOGIES = ("mst", "steiner")
+
+
+# cheap Manhattan pre-pass over a net's pins: decides which pin to connect next and the
+# region of the tree it will most likely join, so each connection is one bounded search
+def pin_topology(pins, root, kind="mst"):
+    """Connection order of pins from root as (pin, region) pairs, root itself excluded
+
+    The pins join one at a time in Prim's order over planar Manhattan distances, layers are
+    ignored. For "mst" a pin's region is the (r0, r1, c0, c1) box, ends inclusive, of the
+    pin already in the tree that is closest to it. For "steiner" every joined pin also adds
+    the straight or L-shaped segment to its attachment point, a pin's distance is measured to
+    the nearest segment's bounding box, and its region is that box. This approximates a
+    rectilinear Steiner tree whose branches join existing wires instead of pins.
+    """
+    if kind not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {kind!r}, expected one of {TOPOLOGIES}")
+    others = [pin for pin in pins if pin != root]
+    if not others:
+        return []
+
+    points = np.array([pin[1:] for pin in others], dtype=np.int64)
+    # per pending pin: distance to the tree and the box it would attach to
+    best = np.full(len(others), np.iinfo(np.int64).max)
+    boxes = np.zeros((len(others), 4), dtype=np.int64)
+    pending = np.ones(len(others), dtype=bool)
+
+    def attach(box):
+        # box as (r0, r1, c0, c1), ends inclusive
+        r0, r1, c0, c1 = box
+        dr = np.maximum(np.maximum(r0 - points[:, 0], points[:, 0] - r1), 0)
+        dc = np.maximum(np.maximum(c0 - points[:, 1], points[:, 1] - c1), 0)
+        closer = pending & (dr + dc < best)
+        best[closer] = (dr + dc)[closer]
+        boxes[closer] = box
+
+    attach((root[1], root[1], root[2], root[2]))
+    order = []
+    for _ in range(len(others)):
+        i = int(np.argmin(np.where(pending, best, np.iinfo(np.int64).max)))
+        pending[i] = False
+        r, c = points[i]
+        order.append((others[i], tuple(int(v) for v in boxes[i])))
+
+        if kind == "steiner":
+            # the segment from the pin to the nearest point of its region joins the tree
+            r0, r1, c0, c1 = boxes[i]
+            nr, nc = min(max(r, r0), r1), min(max(c, c0), c1)
+            attach((min(r, nr), max(r, nr), min(c, nc), max(c, nc)))
+        else:
+            attach((r, r, c, c))
+    return order